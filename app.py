@@ -1,20 +1,34 @@
-from flask import Flask, render_template, request, session, redirect, url_for, jsonify, send_file, flash
+from flask import Blueprint, Flask, Response, current_app, render_template, request, session, redirect, url_for, jsonify, flash, send_file
 from datetime import datetime, timedelta, date
-from models import Database
-from auth import hash_password, verify_password, login_required, admin_required, verify_user_exists, bcrypt
-from utils import calculate_stats, export_csv, import_csv, get_top_drinkers, get_top_drinkers_for_month, calculate_weekly_stats
+from models import Database, CONSUMPTION_FIELDS, MAX_QUANTITY
+from auth import hash_password, verify_password, verify_dummy_password, login_required, admin_required, verify_user_exists, bcrypt, configure_hashing, HashingOverloaded
+from utils import calculate_stats, export_csv, import_csv, get_top_drinkers, get_top_drinkers_for_month, get_drinker_rank, calculate_weekly_stats
 from config import Config
 from flask_wtf.csrf import CSRFProtect
 from i18n import get_request_language, t
-import os
+from cache import LeaderboardCache, create_backend, serve as serve_cache
+from job_runner import JobRunner
+import applied
+import jobs
+import metrics
+from urllib.parse import quote
+import hashlib
+import json
 import uuid
 import logging
-import io
+import atexit
+import base64
+import os
+import time
+import unicodedata
+
+# Routes et commandes de l'application, enregistrées par create_app()
+bp = Blueprint('main', __name__, cli_group=None)
+csrf = CSRFProtect()
 
-app = Flask(__name__)
-app.config.from_object(Config)
-bcrypt.init_app(app)
-csrf = CSRFProtect(app)
+# Tâches de fond affichées sur la page admin, et erreurs d'import conservées par tâche
+JOBS_LISTED = 10
+JOB_MAX_ERRORS = 100
 
 # Configuration du logging
 logging.basicConfig(
@@ -25,60 +39,356 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-@app.context_processor
-def inject_language():
-    return {"lang": get_request_language()}
+def create_app(config=Config):
+    """
+    Construire l'application. Rien n'est écrit en base ici : migrations et
+    compte admin passent par `flask --app app init-db` (voir gunicorn.conf.py).
+    La base et le pool bcrypt sont propres au processus, pas à l'application :
+    une seule application configurée à la fois par processus.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+    bcrypt.init_app(app)
+    csrf.init_app(app)
+    configure_hashing(app.config['BCRYPT_WORKERS'], app.config['BCRYPT_QUEUE_DEPTH'], app.config['BCRYPT_LOG_ROUNDS'])
+
+    # Aucune connexion n'est ouverte ici, seulement à la première requête
+    Database.configure(
+        db_path=app.config['DATABASE_PATH'],
+        pool_size=app.config['DB_POOL_SIZE'],
+        pragmas=app.config['DB_PRAGMAS'],
+        user_cache_ttl=app.config['USER_CACHE_TTL']
+    )
+    atexit.register(Database.close_pool)
+
+    app.extensions['leaderboard_cache'] = LeaderboardCache(
+        create_backend(
+            app.config['LEADERBOARD_CACHE_BACKEND'],
+            socket_path=app.config['LEADERBOARD_CACHE_SOCKET'],
+            max_entries=app.config['LEADERBOARD_CACHE_SIZE']
+        ),
+        ttl=app.config['LEADERBOARD_CACHE_TTL']
+    )
 
-# Initialiser la base de données au démarrage
-Database.init_db()
+    # Threads lancés à la première requête de chaque worker (start_job_runner)
+    app.extensions['job_runner'] = JobRunner(
+        app,
+        {jobs.IMPORT: run_import_job, jobs.EXPORT: run_export_job},
+        workers=app.config['JOB_WORKERS'],
+        poll_interval=app.config['JOB_POLL_INTERVAL'],
+        stale_seconds=app.config['JOB_STALE_SECONDS'],
+        retention_days=app.config['JOB_RETENTION_DAYS']
+    )
 
-admin_username = os.environ.get("ADMIN_USERNAME", "admin")
-admin_password = os.environ.get("ADMIN_PASSWORD")
+    metrics.init_app(app)
+    app.register_blueprint(bp)
+    return app
 
-if not admin_password:
-    raise RuntimeError("ADMIN_PASSWORD must be set")
 
-admin_password_hash = hash_password(admin_password)
+def get_leaderboard_cache():
+    """Cache des classements de l'application courante"""
+    return current_app.extensions['leaderboard_cache']
 
-conn = Database.get_connection()
-cursor = conn.cursor()
 
-cursor.execute(
-    "SELECT id FROM users WHERE username = ? AND is_admin = 1",
-    (admin_username,)
-)
-admin = cursor.fetchone()
+def get_job_runner():
+    return current_app.extensions['job_runner']
+
+
+def cached_ranking(key, compute, version=None):
+    """
+    Classement depuis le cache, sous une clé préfixée par la version des
+    classements (versions.py) : un processus qui n'a pas vu l'invalidation
+    d'un autre ne sert jamais un classement antérieur à la dernière écriture
+    """
+    if version is None:
+        version = Database.get_leaderboard_version()
+    return get_leaderboard_cache().get_or_compute(f"{version}:{key}", compute)
 
-if admin:
-    # Mise à jour systématique
-    cursor.execute(
-        "UPDATE users SET password = ? WHERE username = ? AND is_admin = 1",
-        (admin_password_hash, admin_username)
+
+def yearly_ranking(year, limit=None, offset=0, version=None):
+    """Classement annuel (ou une page de celui-ci), depuis le cache des classements"""
+    return cached_ranking(
+        f"year:{year}:{limit}:{offset}",
+        lambda: [dict(drinker) for drinker in get_top_drinkers(year, limit, offset)],
+        version
     )
-else:
-    # Création
-    cursor.execute(
-        "INSERT INTO users (id, username, password, is_admin) VALUES (?, ?, ?, 1)",
-        (str(uuid.uuid4()), admin_username, admin_password_hash)
+
+
+def monthly_ranking(year, month, limit=None, offset=0, version=None):
+    """Classement mensuel (ou une page de celui-ci), depuis le cache des classements"""
+    return cached_ranking(
+        f"month:{year}-{month:02d}:{limit}:{offset}",
+        lambda: [dict(drinker) for drinker in get_top_drinkers_for_month(year, month, limit, offset)],
+        version
+    )
+
+
+def drinker_rank(user_id, year):
+    """
+    Rang annuel d'un utilisateur : recherche SQL par utilisateur (RANK() sur
+    l'agrégat mensuel), hors du cache pour ne pas en chasser les classements
+    """
+    drinker = get_drinker_rank(user_id, year)
+    return dict(drinker) if drinker else None
+
+
+@bp.before_app_request
+def start_job_runner():
+    get_job_runner().start()
+
+@bp.app_context_processor
+def inject_language():
+    return {"lang": get_request_language()}
+
+@bp.app_errorhandler(HashingOverloaded)
+def hashing_overloaded(error):
+    """Trop de calculs bcrypt en attente : demander au client de réessayer"""
+    logger.warning("File de calcul bcrypt pleine, requête refusée (503)")
+    message = t("server_busy")
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': message})
+    else:
+        response = Response(message, mimetype='text/plain')
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def data_etag(*parts):
+    """ETag fort tiré des versions de données (versions.py) et des paramètres de la réponse"""
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def etag_response(etag, build):
+    """
+    304 si le client a déjà cette version (If-None-Match), sans appeler
+    build() ; sinon la réponse JSON de build(), avec son ETag
+    """
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # Toujours revalider auprès du serveur, mais réutiliser le corps si 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def csv_download(chunks, download_name):
+    """Réponse CSV envoyée en flux, au fur et à mesure de sa génération"""
+    response = Response(chunks, mimetype='text/csv')
+    try:
+        download_name.encode('ascii')
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    except UnicodeEncodeError:
+        # Nom non ASCII : repli ASCII + filename* encodé (RFC 5987), comme send_file
+        simple_name = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        response.headers.set(
+            'Content-Disposition', 'attachment',
+            filename=simple_name, **{'filename*': f"UTF-8''{quote(download_name)}"}
+        )
+    return response
+
+
+def job_file_path(name):
+    """Chemin d'un fichier de tâche de fond (CSV déposé ou produit) dans JOBS_DIR"""
+    jobs_dir = current_app.config['JOBS_DIR']
+    os.makedirs(jobs_dir, exist_ok=True)
+    return os.path.join(jobs_dir, name)
+
+
+def run_import_job(job, report):
+    """
+    Tâche de fond : import CSV complet déposé depuis la page admin. Les
+    quantités s'ajoutent : une reprise (admin_job_resume) repart du point de
+    reprise enregistré avec le dernier lot validé, sans rien compter deux fois
+    """
+    start_row = job['checkpoint']
+    with open(job['input_path'], 'rb') as file:
+        # Lignes du fichier moins l'en-tête : total pour l'avancement
+        total = max(sum(chunk.count(b'\n') for chunk in iter(lambda: file.read(1 << 16), b'')) - 1, 0)
+        file.seek(0)
+        report(start_row, total)
+
+        def batch_written(rows_read):
+            # Chaque lot est validé avec ses nouvelles versions : les classements
+            # suivent l'import au fil de l'eau, pas seulement à la fin
+            get_leaderboard_cache().invalidate()
+            report(rows_read)
+
+        imported_count, errors, created_users = import_csv(
+            file, all_users=True, progress=batch_written, job_id=job['id'], start_row=start_row
+        )
+    os.remove(job['input_path'])
+    return {
+        'resumed_from': start_row,
+        'imported': imported_count,
+        'created_users': created_users,
+        'errors': errors[:JOB_MAX_ERRORS],
+        'error_count': len(errors),
+    }, None
+
+
+def run_export_job(job, report):
+    """Tâche de fond : export CSV complet, écrit dans JOBS_DIR"""
+    path = job_file_path(f"export-{job['id']}.csv")
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        for chunk in export_csv(all_users=True, progress=report):
+            file.write(chunk)
+    return {
+        'rows': report.value,
+        'download_name': f"consommation_complete_{datetime.now().strftime('%Y%m%d')}.csv",
+    }, path
+
+
+def import_message(result):
+    """Compte rendu d'un import (résultat de run_import_job)"""
+    message = t("admin_import_completed", count=result['imported'])
+    if result.get('resumed_from'):
+        message += f"\n{t('admin_import_resumed', count=result['resumed_from'])}"
+    if result['created_users']:
+        message += f"\n{t('admin_import_users_created', count=len(result['created_users']))}"
+        for u in result['created_users']:
+            message += f"\n- {u['username']} / {u['password']}"
+        message += f"\n{t('admin_import_important')}"
+    if result['error_count']:
+        message += f"\n{t('admin_import_errors', count=result['error_count'])}"
+        for e in result['errors']:
+            message += f"\n- {e}"
+    return message
+
+
+def job_resumable(job):
+    """Import en échec dont le fichier est encore là : peut reprendre après son point de reprise"""
+    return (
+        job['kind'] == jobs.IMPORT and job['status'] == jobs.FAILED
+        and bool(job['input_path']) and os.path.exists(job['input_path'])
     )
 
-conn.commit()
-conn.close()
 
-@app.route('/')
+def job_summary(job):
+    """État d'une tâche de fond pour la page admin et GET /admin/jobs/<id>"""
+    summary = {key: job[key] for key in ('id', 'kind', 'status', 'progress', 'total', 'created_at')}
+    summary['finished'] = job['status'] in jobs.FINISHED
+    summary['message'] = None
+    summary['download_url'] = None
+    summary['resumable'] = job_resumable(job)
+    if job['status'] == jobs.FAILED:
+        summary['message'] = t("admin_job_failed", error=job['error'])
+    elif job['status'] == jobs.DONE and job['kind'] == jobs.IMPORT:
+        summary['message'] = import_message(job['result'])
+    elif job['status'] == jobs.DONE and job['kind'] == jobs.EXPORT:
+        summary['download_url'] = url_for('main.admin_job_download', job_id=job['id'])
+    return summary
+
+
+def bootstrap_admin():
+    """Créer le compte admin, ou remettre son mot de passe à ADMIN_PASSWORD"""
+    admin_username = current_app.config['ADMIN_USERNAME']
+    admin_password = current_app.config['ADMIN_PASSWORD']
+
+    if not admin_password:
+        raise RuntimeError("ADMIN_PASSWORD must be set")
+
+    admin_password_hash = hash_password(admin_password)
+
+    with Database.transaction() as conn:
+        admin = conn.execute(
+            "SELECT id FROM users WHERE username = ? AND is_admin = 1",
+            (admin_username,)
+        ).fetchone()
+
+        if admin:
+            # Mise à jour systématique
+            conn.execute(
+                "UPDATE users SET password = ? WHERE username = ? AND is_admin = 1",
+                (admin_password_hash, admin_username)
+            )
+        else:
+            # Création
+            conn.execute(
+                "INSERT INTO users (id, username, password, is_admin) VALUES (?, ?, ?, 1)",
+                (str(uuid.uuid4()), admin_username, admin_password_hash)
+            )
+
+
+def initialize_database():
+    """
+    Travail de démarrage, une seule fois par déploiement (et non par worker) :
+    migrations puis création / mise à jour du compte admin
+    """
+    Database.init_db()
+    bootstrap_admin()
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Appliquer les migrations et créer / mettre à jour le compte admin"""
+    initialize_database()
+    print("Base de données initialisée")
+
+@bp.cli.command('bootstrap-admin')
+def bootstrap_admin_command():
+    """Créer le compte admin ou réinitialiser son mot de passe"""
+    bootstrap_admin()
+    print(f"Compte admin '{current_app.config['ADMIN_USERNAME']}' prêt")
+
+@bp.cli.command('cache-server')
+def cache_server_command():
+    """Lancer le serveur de cache des classements partagé entre workers"""
+    serve_cache(current_app.config['LEADERBOARD_CACHE_SOCKET'], current_app.config['LEADERBOARD_CACHE_SIZE'])
+
+@bp.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recalculer les tables d'agrégats depuis consumption"""
+    count = Database.rebuild_rollups()
+    get_leaderboard_cache().invalidate()
+    print(f"Agrégats recalculés pour {count} utilisateur(s)")
+
+@bp.cli.command('check-rollups')
+def check_rollups_command():
+    """Vérifier que les tables d'agrégats correspondent à consumption"""
+    mismatches = Database.check_rollups()
+    for table, user_id, period in mismatches:
+        print(f"{table}: {user_id} {period}")
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} écart(s) détecté(s), lancer 'flask rebuild-rollups'")
+    print("Agrégats cohérents")
+
+@bp.cli.command('archive-years')
+def archive_years_command():
+    """Déplacer les années closes vers l'archive compacte (voir ARCHIVE_KEEP_YEARS)"""
+    before_year = date.today().year - current_app.config['ARCHIVE_KEEP_YEARS']
+    archived = Database.archive_years(before_year)
+    for year, count in archived.items():
+        print(f"{year} : {count} consommation(s) archivée(s)")
+    print(f"Années antérieures à {before_year} archivées")
+
+@bp.cli.command('run-jobs')
+def run_jobs_command():
+    """Exécuter les tâches de fond dans ce processus (avec JOB_WORKERS=0 côté web)"""
+    runner = get_job_runner()
+    runner.start(max(current_app.config['JOB_WORKERS'], 1))
+    print("Exécution des tâches de fond, Ctrl+C pour arrêter")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        runner.stop()
+
+@bp.route('/')
 def index():
     if 'user_id' in session:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('login'))
+        return redirect(url_for('main.dashboard'))
+    return redirect(url_for('main.login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     # Si déjà connecté alors redirection vers dashboard
     if 'user_id' in session:
         if verify_user_exists(session['user_id']):
             if session.get('is_admin'):
-                return redirect(url_for('admin'))
-            return redirect(url_for('dashboard'))
+                return redirect(url_for('main.admin'))
+            return redirect(url_for('main.dashboard'))
         else:
             session.clear()
     if request.method == 'POST':
@@ -86,53 +396,47 @@ def login():
         password = request.form.get('password', '').strip()
         client_ip = request.remote_addr
         
-        # Vérifier si l'utilisateur classique existe
-        if Database.user_exists(username):
-            user_id = Database.get_user_id(username)
-            conn = Database.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'SELECT id, password, is_admin FROM users WHERE username = ?',
-                (username,)
-            )
-            user = cursor.fetchone()
-            conn.close()
-            
-            if user and verify_password(password, user['password']):
-                app.logger.info(f'{client_ip} Authentification successful for user {username}')
-                session.clear()  # rotation de session
-                session['user_id'] = user['id']
-                session['username'] = username
-                session['is_admin'] = bool(user['is_admin'])
-                session.permanent = True
-                return redirect(url_for('index'))
-
-            else:
-                # Mot de passe utilisateur incorrect
-                app.logger.warning(f'{client_ip} Authentification failed for user {username} (incorrect password)')
-                return render_template('login.html', error=t("login_incorrect_password"))
-        else:
-            # Utilisateur n'existe pas
-            app.logger.warning(f'{client_ip} Authentification failed for user {username} (unknown user)')
+        # Une seule requête : id, hash et statut admin
+        user = Database.get_user_auth(username)
+        if user is None:
+            # Utilisateur n'existe pas : vérification factice pour une durée
+            # de réponse identique à celle d'un mauvais mot de passe
+            verify_dummy_password(password)
+            current_app.logger.warning(f'{client_ip} Authentification failed for user {username} (unknown user)')
             return render_template('login.html', error=t("login_unknown_user"))
+
+        if verify_password(password, user['password']):
+            current_app.logger.info(f'{client_ip} Authentification successful for user {username}')
+            session.clear()  # rotation de session
+            session['user_id'] = user['id']
+            session['username'] = username
+            session['is_admin'] = bool(user['is_admin'])
+            session.permanent = True
+            return redirect(url_for('main.index'))
+
+        # Mot de passe utilisateur incorrect
+        current_app.logger.warning(f'{client_ip} Authentification failed for user {username} (incorrect password)')
+        return render_template('login.html', error=t("login_incorrect_password"))
     
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
     if session.get('is_admin'):
-        return redirect(url_for('admin'))
+        return redirect(url_for('main.admin'))
 
     current_year = date.today().year
     current_month = date.today().month
-    top_month_drinkers = get_top_drinkers_for_month(current_year, current_month)[:3]
-    top_drinkers = get_top_drinkers(current_year)[:3]
+    version = Database.get_leaderboard_version()
+    top_month_drinkers = monthly_ranking(current_year, current_month, limit=3, version=version)
+    top_drinkers = yearly_ranking(current_year, limit=3, version=version)
+    my_rank = drinker_rank(session['user_id'], current_year)
 
     show_monthly_ranking = len(top_month_drinkers) >= 1
     show_ranking = len(top_drinkers) >= 2
@@ -144,11 +448,75 @@ def dashboard():
         top_drinkers=top_drinkers,
         show_monthly_ranking=show_monthly_ranking,
         show_ranking=show_ranking,
+        my_rank=my_rank,
         ranking_month=current_month,
         ranking_year=current_year
     )
 
-@app.route('/api/consumption', methods=['GET', 'POST'])
+# Réponses de GET /api/consumption : totaux et statistiques seuls, une page
+# d'enregistrements seule, ou les deux (défaut)
+CONSUMPTION_VIEWS = ('full', 'summary', 'records')
+
+
+def encode_cursor(date_value, time_value):
+    """
+    Curseur de pagination : (date, heure) bruts de la dernière ligne, tels
+    qu'en base (une heure importée peut valoir '20:00'), en JSON base64
+    """
+    return base64.urlsafe_b64encode(json.dumps([date_value, time_value]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(date, heure) d'un curseur de encode_cursor ; ValueError si invalide"""
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("invalid cursor")
+    if not (isinstance(value, list) and len(value) == 2 and all(isinstance(part, str) for part in value)):
+        raise ValueError("invalid cursor")
+    return tuple(value)
+
+
+def consumption_page(user_id, start_date, end_date):
+    """
+    Page d'enregistrements selon les paramètres limit, cursor et fields.
+    Le curseur est opaque pour le client : il renvoie tel quel next_cursor.
+    """
+    max_limit = current_app.config['CONSUMPTION_MAX_PAGE_SIZE']
+    limit = request.args.get('limit', current_app.config['CONSUMPTION_PAGE_SIZE'], type=int)
+    if not 1 <= limit <= max_limit:
+        raise ValueError(f"limit must be between 1 and {max_limit}")
+    
+    before = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        before = decode_cursor(cursor)
+    
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in CONSUMPTION_FIELDS]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    # date et time servent à construire le curseur suivant
+    query_fields = list(dict.fromkeys((fields or list(CONSUMPTION_FIELDS)) + ['date', 'time']))
+    
+    # Une ligne de plus que demandé pour savoir s'il existe une page suivante
+    rows = Database.get_consumption_page(user_id, start_date, end_date, limit + 1, before, query_fields)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['date'], rows[-1]['time'])
+    
+    return {
+        'records': [
+            {field: row[field] for field in (fields or CONSUMPTION_FIELDS)}
+            for row in rows
+        ],
+        'next_cursor': next_cursor
+    }
+
+@bp.route('/api/consumption', methods=['GET', 'POST'])
 @login_required
 def api_consumption():
     user_id = session['user_id']
@@ -162,50 +530,201 @@ def api_consumption():
         liters_33 = int(data.get('liters_33', 0))
         
         Database.add_consumption(user_id, date, pints, half_pints, liters_33, time)
+        get_leaderboard_cache().invalidate()
         
         return jsonify({'success': True})
     
-    # GET - récupérer les stats
+    # GET - récupérer les stats et / ou une page d'enregistrements
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    for name, value in (('start_date', start_date), ('end_date', end_date)):
+        if value and not is_iso_date(value):
+            return jsonify({'error': f"{name} must be YYYY-MM-DD"}), 400
+    view = request.args.get('view', 'full')
+    if view not in CONSUMPTION_VIEWS:
+        return jsonify({'error': f"view must be one of: {', '.join(CONSUMPTION_VIEWS)}"}), 400
     
-    stats = calculate_stats(user_id, start_date, end_date)
-    weekly_stats = calculate_weekly_stats(user_id)  # AJOUTER CETTE LIGNE
+    # Alertes et semaines dépendent aussi du jour courant
+    state = Database.get_user_data_state(user_id)
+    etag = data_etag(
+        'consumption', user_id, state['data_version'] if state else None,
+        datetime.now().strftime('%Y-%m-%d'), sorted(request.args.items(multi=True))
+    )
+    
+    def build():
+        response = {}
+        if view != 'records':
+            weekly_stats = calculate_weekly_stats(user_id, current_app.config['WEEKLY_STATS_WEEKS'])
+            stats = calculate_stats(user_id, start_date, end_date, include_records=False, weekly_stats=weekly_stats)
+            response.update({
+                'total_pints': stats['total_pints'],
+                'total_half_pints': stats['total_half_pints'],
+                'total_33cl': stats['total_33cl'],
+                'total_liters': stats['total_liters'],
+                'warnings': stats['warnings'], 
+                'monthly_stats': stats['monthly_stats'],
+                'daily_stats': [dict(day) for day in Database.get_daily_consumption(user_id, start_date, end_date)],
+                'weekly_stats': weekly_stats
+            })
+        if view != 'summary':
+            response.update(consumption_page(user_id, start_date, end_date))
+        return response
+    
+    try:
+        return etag_response(etag, build)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+def is_iso_date(value):
+    """Date au format strict YYYY-MM-DD (zéros compris) : dates et heures sont comparées comme du texte"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d') == value
+    except (TypeError, ValueError):
+        return False
+
+def parse_consumption_entry(item):
+    """Valider une consommation envoyée par un client ; ValueError si invalide"""
+    if not isinstance(item, dict):
+        raise ValueError("entry must be an object")
+    
+    entry_date = item.get('date')
+    entry_time = item.get('time')
+    if not is_iso_date(entry_date):
+        raise ValueError("date must be YYYY-MM-DD")
+    # Format strict également pour l'heure
+    try:
+        valid_time = datetime.strptime(entry_time, '%H:%M:%S').strftime('%H:%M:%S') == entry_time
+    except (TypeError, ValueError):
+        valid_time = False
+    if not valid_time:
+        raise ValueError("time must be HH:MM:SS")
+    
+    quantities = []
+    for field in ('pints', 'half_pints', 'liters_33'):
+        value = item.get(field, 0)
+        # bool est un int en Python : on le refuse explicitement
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{field} must be an integer")
+        # Négatif : décrément (boutons « − » du tableau de bord), comme à l'import
+        if abs(value) > MAX_QUANTITY:
+            raise ValueError(f"{field} must be between {-MAX_QUANTITY} and {MAX_QUANTITY}")
+        quantities.append(value)
+    if not any(quantities):
+        raise ValueError("entry has no quantity")
+    
+    return (entry_date, entry_time, *quantities)
+
+def parse_entry_id(item):
+    """Id client facultatif d'une consommation (voir applied) ; ValueError si invalide"""
+    entry_id = item.get('id')
+    if entry_id is None:
+        return None
+    if not isinstance(entry_id, str) or not 0 < len(entry_id) <= applied.MAX_ID_LENGTH:
+        raise ValueError(f"id must be a string of at most {applied.MAX_ID_LENGTH} characters")
+    return entry_id
+
+@bp.route('/api/consumption/batch', methods=['POST'])
+@login_required
+def api_consumption_batch():
+    """
+    Enregistrer plusieurs consommations (file d'attente d'un client hors
+    ligne, borne...) en une seule transaction. Les entrées invalides sont
+    signalées une par une, les valides sont écrites. Une entrée avec un id
+    déjà appliqué est acceptée sans être réécrite (duplicate) : le client
+    peut rejouer un lot dont il n'a pas reçu la réponse.
+    """
+    user_id = session['user_id']
+    data = request.get_json(silent=True)
+    items = data.get('entries') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify({'error': "expected a JSON array of entries (or {\"entries\": [...]})"}), 400
+    
+    max_entries = current_app.config['CONSUMPTION_BATCH_MAX']
+    if len(items) > max_entries:
+        return jsonify({'error': f"at most {max_entries} entries per batch"}), 400
+    
+    entries = []
+    results = []
+    for index, item in enumerate(items):
+        try:
+            values = parse_consumption_entry(item)
+            entries.append((parse_entry_id(item), values))
+            results.append({'index': index, 'ok': True})
+        except ValueError as e:
+            results.append({'index': index, 'ok': False, 'error': str(e)})
+    
+    # Même (date, heure) : les quantités s'additionnent, comme POST /api/consumption
+    new_entries = iter(Database.add_client_consumption_batch(user_id, entries))
+    written = 0
+    for result in results:
+        if result['ok']:
+            if next(new_entries):
+                written += 1
+            else:
+                result['duplicate'] = True
+    if written:
+        get_leaderboard_cache().invalidate()
     
     return jsonify({
-        'total_pints': stats['total_pints'],
-        'total_half_pints': stats['total_half_pints'],
-        'total_33cl': stats['total_33cl'],
-        'total_liters': stats['total_liters'],
-        'warnings': stats['warnings'], 
-        'monthly_stats': stats['monthly_stats'],
-        'records': [dict(record) for record in stats['all_records']],
-        'weekly_stats': weekly_stats  # AJOUTER CETTE LIGNE
+        'success': all(result['ok'] for result in results),
+        'written': written,
+        'results': results
     })
 
-@app.route('/api/export', methods=['GET'])
+@bp.route('/api/leaderboard', methods=['GET'])
+@login_required
+def api_leaderboard():
+    """Classement annuel (period=year, défaut) ou du mois en cours (period=month)"""
+    period = request.args.get('period', 'year')
+    if period not in ('year', 'month'):
+        return jsonify({'error': "period must be 'year' or 'month'"}), 400
+    limit = request.args.get('limit', 3, type=int)
+    if not 1 <= limit <= current_app.config['RANKING_PAGE_SIZE']:
+        return jsonify({'error': f"limit must be between 1 and {current_app.config['RANKING_PAGE_SIZE']}"}), 400
+    
+    today = date.today()
+    # Même version pour l'ETag et la clé du cache : le corps correspond à l'ETag
+    version = Database.get_leaderboard_version()
+    etag = data_etag('leaderboard', version, period, today.year, today.month, limit)
+    
+    def build():
+        if period == 'month':
+            drinkers = monthly_ranking(today.year, today.month, limit=limit, version=version)
+        else:
+            drinkers = yearly_ranking(today.year, limit=limit, version=version)
+        return {'period': period, 'year': today.year, 'month': today.month, 'drinkers': drinkers}
+    
+    return etag_response(etag, build)
+
+@bp.route('/api/export', methods=['GET'])
 @login_required
 def api_export():
     user_id = session['user_id']
-    csv_data = export_csv(user_id)
     
-    return send_file(
-        io.BytesIO(csv_data.encode()),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f"consommation_{session['username']}.csv"
-    )
+    return csv_download(export_csv(user_id), f"consommation_{session['username']}.csv")
 
-@app.route('/admin')
+@bp.route('/admin')
 @admin_required
 def admin():
     users = Database.get_all_users()
     current_year = date.today().year
-    top_drinkers = get_top_drinkers(current_year)
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = current_app.config['RANKING_PAGE_SIZE']
+    # Une ligne de plus que la page pour savoir s'il existe une page suivante
+    top_drinkers = yearly_ranking(current_year, limit=page_size + 1, offset=(page - 1) * page_size)
+    has_next_page = len(top_drinkers) > page_size
     
-    return render_template('admin.html', users=users, top_drinkers=top_drinkers, ranking_year=current_year)
+    return render_template(
+        'admin.html',
+        users=users,
+        top_drinkers=top_drinkers[:page_size],
+        ranking_year=current_year,
+        ranking_page=page,
+        has_next_page=has_next_page,
+        jobs=[job_summary(job) for job in Database.get_recent_jobs(JOBS_LISTED)]
+    )
 
-@app.route('/admin/user/create', methods=['POST'])
+@bp.route('/admin/user/create', methods=['POST'])
 @admin_required
 def admin_create_user():
     username = request.form.get('username', '').strip()
@@ -213,21 +732,24 @@ def admin_create_user():
 
     if not username or not password:
         flash(t("admin_user_required"), "error")
-        return redirect(url_for('admin'))  
+        return redirect(url_for('main.admin'))  
 
     password_hash = hash_password(password)
     success, _ = Database.create_user(username, password_hash)
+    if success:
+        get_leaderboard_cache().invalidate()
 
     flash(t("admin_user_created") if success else t("admin_user_create_error"), "success" if success else "error")
-    return redirect(url_for('admin'))  
+    return redirect(url_for('main.admin'))  
 
-@app.route('/admin/user/<user_id>/delete', methods=['POST'])
+@bp.route('/admin/user/<user_id>/delete', methods=['POST'])
 @admin_required
 def admin_delete_user(user_id):
     Database.delete_user(user_id)
-    return redirect(url_for('admin'))
+    get_leaderboard_cache().invalidate()
+    return redirect(url_for('main.admin'))
 
-@app.route('/admin/user/<user_id>/password', methods=['POST'])
+@bp.route('/admin/user/<user_id>/password', methods=['POST'])
 @admin_required
 def admin_change_password(user_id):
     new_password = request.form.get('password', '').strip()
@@ -243,57 +765,90 @@ def admin_change_password(user_id):
         password_hash = hash_password(new_password)
         Database.update_user_password(username, password_hash)
     
-    return redirect(url_for('admin'))
+    return redirect(url_for('main.admin'))
 
-@app.route('/admin/export', methods=['GET'])
+@bp.route('/admin/export', methods=['GET', 'POST'])
 @admin_required
 def admin_export():
-    csv_data = export_csv(all_users=True)
-    
-    return send_file(
-        io.BytesIO(csv_data.encode()),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f"consommation_complete_{datetime.now().strftime('%Y%m%d')}.csv"
+    # POST (page admin) : export en tâche de fond, GET : export direct en flux
+    if request.method == 'POST':
+        Database.create_job(jobs.EXPORT, session['user_id'])
+        get_job_runner().notify()
+        flash(t("admin_export_queued"), "success")
+        return redirect(url_for('main.admin'))
+
+    return csv_download(
+        export_csv(all_users=True),
+        f"consommation_complete_{datetime.now().strftime('%Y%m%d')}.csv"
     )
 
-@app.route('/admin/import', methods=['POST'])
+@bp.route('/admin/import', methods=['POST'])
 @admin_required
 def admin_import():
     if 'file' not in request.files:
         flash(t("admin_no_file_sent"), "error")
-        return redirect(url_for('admin'))
+        return redirect(url_for('main.admin'))
 
     file = request.files['file']
     if not file.filename:
         flash(t("admin_no_file_selected"), "error")
-        return redirect(url_for('admin'))
+        return redirect(url_for('main.admin'))
 
-    imported_count, errors, created_users = import_csv(file.read(), all_users=True)
+    # Le fichier est seulement déposé : l'import (bcrypt, écritures) se fait en tâche de fond
+    input_path = job_file_path(f"import-{uuid.uuid4()}.csv")
+    file.save(input_path)
+    Database.create_job(jobs.IMPORT, session['user_id'], input_path)
+    get_job_runner().notify()
 
-    # Construit le message (reprend ta logique actuelle)
-    message = t("admin_import_completed", count=imported_count)
-    if created_users:
-        message += f"\n{t('admin_import_users_created', count=len(created_users))}"
-        for u in created_users:
-            message += f"\n- {u['username']} / {u['password']}"
-        message += f"\n{t('admin_import_important')}"
-    if errors:
-        message += f"\n{t('admin_import_errors', count=len(errors))}"
-        for e in errors:
-            message += f"\n- {e}"
+    flash(t("admin_import_queued"), "success")
+    return redirect(url_for('main.admin'))
 
-    flash(message, "success" if imported_count > 0 and not errors else "warning")
-    return redirect(url_for('admin'))
+@bp.route('/admin/jobs/<job_id>', methods=['GET'])
+@admin_required
+def admin_job_status(job_id):
+    job = Database.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(job_summary(job))
+
+@bp.route('/admin/jobs/<job_id>/resume', methods=['POST'])
+@admin_required
+def admin_job_resume(job_id):
+    """Relancer un import interrompu ou en échec, à partir de son point de reprise"""
+    job = Database.get_job(job_id)
+    if job is None or not job_resumable(job) or not Database.resume_job(job_id):
+        flash(t("admin_job_not_resumable"), "error")
+        return redirect(url_for('main.admin'))
+    get_job_runner().notify()
+
+    flash(t("admin_import_queued"), "success")
+    return redirect(url_for('main.admin'))
+
+@bp.route('/admin/jobs/<job_id>/download', methods=['GET'])
+@admin_required
+def admin_job_download(job_id):
+    job = Database.get_job(job_id)
+    if job is None or job['status'] != jobs.DONE or not job['result_path'] or not os.path.exists(job['result_path']):
+        return jsonify({'error': 'Not found'}), 404
+    return send_file(
+        job['result_path'],
+        mimetype='text/csv',
+        as_attachment=True,
+        download_name=job['result']['download_name']
+    )
 
-@app.route('/api/night-mode', methods=['GET', 'POST'])
+@bp.route('/api/night-mode', methods=['GET', 'POST'])
 @login_required
 def night_mode():
     """Gérer le mode soirée"""
     if request.method == 'GET':
         user_id = session['user_id']
-        is_enabled = Database.get_night_mode_status(user_id)
-        return jsonify({'night_mode_enabled': is_enabled})
+        # Le mode soirée expire avec l'heure : l'ETag tient compte de l'échéance
+        state = Database.get_user_data_state(user_id)
+        until = state['night_mode_until'] if state else None
+        active = bool(until) and datetime.now() <= datetime.fromisoformat(until)
+        etag = data_etag('night-mode', user_id, state['data_version'] if state else None, active)
+        return etag_response(etag, lambda: {'night_mode_enabled': Database.get_night_mode_status(user_id)})
     
     if request.method == 'POST':
         data = request.get_json()
@@ -308,7 +863,7 @@ def night_mode():
         })
 
 # Endpoint admin pour gérer le mode soirée d'autres utilisateurs
-@app.route('/admin/night-mode/<user_id>', methods=['POST'])
+@bp.route('/admin/night-mode/<user_id>', methods=['POST'])
 @admin_required
 def toggle_night_mode(user_id):
     """Admin: Basculer le mode soirée (vrai toggle)"""
@@ -325,21 +880,27 @@ def toggle_night_mode(user_id):
     return jsonify({'success': True, 'message': action})
 
 
-@app.route('/api/night-mode-status/<user_id>', methods=['GET'])
+@bp.route('/api/night-mode-status/<user_id>', methods=['GET'])
 @admin_required
 def get_night_mode_status(user_id):
     """Admin: Récupère l'état du mode soirée pour un utilisateur"""
     is_enabled = Database.get_night_mode_status(user_id)
     return jsonify({'night_mode_enabled': is_enabled})
 
-@app.route('/change-password', methods=['GET', 'POST'])
+@bp.route('/metrics')
+@admin_required
+def metrics_endpoint():
+    """Admin: métriques du worker courant au format texte Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/change-password', methods=['GET', 'POST'])
 @login_required
 def change_password():
     """Permet à un utilisateur de changer son mot de passe"""
     
     # Bloquer l'accès pour l'administrateur
     if session.get('is_admin'):
-        return redirect(url_for('admin'))
+        return redirect(url_for('main.admin'))
     
     if request.method == 'POST':
         current_password = request.form.get('current_password', '').strip()
@@ -379,7 +940,7 @@ def change_password():
         password_hash = hash_password(new_password)
         Database.update_user_password(username, password_hash)
         
-        app.logger.info(f"Password changed successfully for user {username}")
+        current_app.logger.info(f"Password changed successfully for user {username}")
         return render_template('password.html', 
                              success=t("password_changed_success"),
                              username=session['username'])
@@ -387,4 +948,8 @@ def change_password():
     return render_template('password.html', username=session['username'])
 
 if __name__ == '__main__':
+    # Serveur de développement ; en production : gunicorn -c gunicorn.conf.py "app:create_app()"
+    app = create_app()
+    with app.app_context():
+        initialize_database()
     app.run(host='0.0.0.0', port=(Config.APP_PORT), debug=False)
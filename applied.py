@@ -0,0 +1,38 @@
+# Entrées déjà appliquées des files d'attente clients, par id généré dans le
+# navigateur : rejouer un lot dont la réponse s'est perdue, ou l'envoyer depuis
+# un second onglet, n'ajoute pas deux fois les mêmes quantités. Les ids sont
+# gardés RETENTION_DAYS jours, bien au-delà du délai de rejeu d'une file.
+
+RETENTION_DAYS = 30
+
+# Longueur maximale d'un id client (un UUID en fait 36)
+MAX_ID_LENGTH = 64
+
+
+def create_tables(conn):
+    """Créer la table des entrées client déjà appliquées"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS applied_entries (
+            user_id TEXT NOT NULL,
+            id TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_applied_entries_applied_at ON applied_entries (applied_at)')
+
+
+def claim(conn, user_id, entry_id):
+    """Marquer l'entrée appliquée, dans la transaction qui l'écrit ; False si elle l'était déjà"""
+    return conn.execute(
+        'INSERT OR IGNORE INTO applied_entries (user_id, id) VALUES (?, ?)',
+        (user_id, entry_id)
+    ).rowcount == 1
+
+
+def prune(conn):
+    """Oublier les ids plus vieux que RETENTION_DAYS"""
+    conn.execute(
+        "DELETE FROM applied_entries WHERE applied_at < datetime('now', ?)",
+        (f'-{RETENTION_DAYS} days',)
+    )
@@ -0,0 +1,259 @@
+# Archive des années closes : les consommations anciennes quittent la table
+# consumption (UUID, date et heure en texte, deux index couvrants) pour
+# archive_consumption, une seule table WITHOUT ROWID en entiers :
+# - user_key : entier attribué par archive_users à chaque user_id
+# - day : jours depuis le 1970-01-01, seconds : secondes depuis minuit
+# Les agrégats (rollups.py) ne changent pas, les classements non plus ; les
+# lectures de consommations brutes passent par les deux tables (voir
+# UNION_SOURCE et user_rows). Seules les lignes dont l'encodage redonne
+# exactement la date et l'heure d'origine sont archivées : les autres restent
+# dans consumption, rien n'est perdu. Une consommation ajoutée après coup à
+# une année déjà archivée rejoint directement l'archive (absorb_late_entries).
+from datetime import date
+import versions
+
+# Nombre d'utilisateurs archivés par transaction
+ARCHIVE_BATCH_SIZE = 50
+
+EPOCH = date(1970, 1, 1)
+
+_ENCODE_DAY = "CAST(strftime('%s', consumption.date) AS INTEGER) / 86400"
+_ENCODE_SECONDS = "CAST(strftime('%s', '1970-01-01 ' || consumption.time) AS INTEGER)"
+DECODE_DATE = "date(archive_consumption.day * 86400, 'unixepoch')"
+DECODE_TIME = "time(archive_consumption.seconds, 'unixepoch')"
+
+# Lignes de consumption dont l'encodage est sans perte
+_ROUND_TRIP = f'''
+    date(({_ENCODE_DAY}) * 86400, 'unixepoch') = consumption.date
+    AND time({_ENCODE_SECONDS}, 'unixepoch') = consumption.time
+'''
+
+# Toutes les consommations (chaudes et archivées), mêmes colonnes que
+# consumption sauf id : source des recalculs d'agrégats
+UNION_SOURCE = f'''
+    (
+        SELECT user_id, date, time, pints, half_pints, liters_33 FROM consumption
+        UNION ALL
+        SELECT archive_users.user_id, {DECODE_DATE}, {DECODE_TIME},
+               archive_consumption.pints, archive_consumption.half_pints, archive_consumption.liters_33
+        FROM archive_consumption
+        JOIN archive_users ON archive_users.key = archive_consumption.user_key
+    )
+'''
+
+
+def create_tables(conn):
+    """Créer les tables de l'archive"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_users (
+            key INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL UNIQUE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_consumption (
+            user_key INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            seconds INTEGER NOT NULL,
+            pints INTEGER NOT NULL DEFAULT 0,
+            half_pints INTEGER NOT NULL DEFAULT 0,
+            liters_33 INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_key, day, seconds)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_years (
+            year INTEGER PRIMARY KEY,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# Consommation tardive (user_id, date, time) d'une année archivée : rejoint
+# son créneau de l'archive, ou en crée un
+_MOVE_LATE_ENTRY = f'''
+    INSERT INTO archive_consumption (user_key, day, seconds, pints, half_pints, liters_33)
+    SELECT archive_users.key, {_ENCODE_DAY}, {_ENCODE_SECONDS},
+           COALESCE(consumption.pints, 0), COALESCE(consumption.half_pints, 0),
+           COALESCE(consumption.liters_33, 0)
+    FROM consumption
+    JOIN archive_users ON archive_users.user_id = consumption.user_id
+    WHERE consumption.user_id = ? AND consumption.date = ? AND consumption.time = ?
+      AND {_ROUND_TRIP}
+    ON CONFLICT (user_key, day, seconds) DO UPDATE SET
+        pints = pints + excluded.pints,
+        half_pints = half_pints + excluded.half_pints,
+        liters_33 = liters_33 + excluded.liters_33
+'''
+_DELETE_LATE_ENTRY = f'''
+    DELETE FROM consumption
+    WHERE user_id = ? AND date = ? AND time = ? AND {_ROUND_TRIP}
+'''
+
+
+def encode_date(value):
+    """'YYYY-MM-DD' -> jours depuis le 1970-01-01 (ValueError si invalide)"""
+    return (date.fromisoformat(value) - EPOCH).days
+
+
+# Colonnes de consumption et leur équivalent dans archive_consumption
+_USER_ROW_COLUMNS = {
+    'id': 'NULL AS id',
+    'user_id': '? AS user_id',
+    'date': f'{DECODE_DATE} AS date',
+    'time': f'{DECODE_TIME} AS time',
+    'pints': 'pints',
+    'half_pints': 'half_pints',
+    'liters_33': 'liters_33',
+}
+
+
+def user_rows(user_id, start_date=None, end_date=None, before=None, limit=None, columns=None):
+    """
+    Consommations archivées d'un utilisateur, décodées, de la plus récente à
+    la plus ancienne (ordre de la clé primaire, sans tri). columns : colonnes
+    de consumption à retourner, toutes par défaut ; id vaut NULL.
+    Retourne (requête, paramètres).
+    """
+    columns = columns or list(_USER_ROW_COLUMNS)
+    query = f'''
+        SELECT {', '.join(_USER_ROW_COLUMNS[column] for column in columns)}
+        FROM archive_consumption
+        WHERE user_key = (SELECT key FROM archive_users WHERE user_id = ?)
+    '''
+    params = [user_id] * columns.count('user_id') + [user_id]
+
+    if start_date:
+        query += ' AND day >= ?'
+        params.append(encode_date(start_date))
+
+    if end_date:
+        query += ' AND day <= ?'
+        params.append(encode_date(end_date))
+
+    if before is not None:
+        # Comparaison des valeurs décodées, comme dans consumption (le curseur
+        # peut venir d'une ligne non archivée au format irrégulier) ; la borne
+        # sur day garde un parcours de la clé primaire
+        query += f' AND ({DECODE_DATE}, {DECODE_TIME}) < (?, ?)'
+        params.extend(before)
+        try:
+            before_day = encode_date(before[0])
+        except ValueError:
+            pass
+        else:
+            query += ' AND day <= ?'
+            params.append(before_day)
+
+    query += ' ORDER BY day DESC, seconds DESC LIMIT ?'
+    params.append(-1 if limit is None else limit)
+    return query, params
+
+
+def delete_user(conn, user_id):
+    """Supprimer les consommations archivées d'un utilisateur, dans la transaction de l'appelant"""
+    conn.execute(
+        'DELETE FROM archive_consumption WHERE user_key = (SELECT key FROM archive_users WHERE user_id = ?)',
+        (user_id,)
+    )
+    conn.execute('DELETE FROM archive_users WHERE user_id = ?', (user_id,))
+
+
+def absorb_late_entries(conn, entries):
+    """
+    Consommations qui viennent d'être écrites dans consumption pour une année
+    déjà archivée : déplacées dans l'archive, dans la transaction de
+    l'appelant. Un (utilisateur, date, heure) n'est ainsi jamais dans les deux
+    tables (lectures fusionnées et curseurs de pagination restent sans
+    doublon). entries : tuples (user_id, date, time, ...).
+    """
+    years = {entry[1][:4] for entry in entries}
+    archived = {
+        year for year in years
+        if year.isdigit() and conn.execute('SELECT 1 FROM archived_years WHERE year = ?', (int(year),)).fetchone()
+    }
+    # Un créneau n'est déplacé qu'une fois, même présent plusieurs fois dans le lot
+    late = list(dict.fromkeys(tuple(entry[:3]) for entry in entries if entry[1][:4] in archived))
+    if not late:
+        return
+    conn.executemany(
+        'INSERT OR IGNORE INTO archive_users (user_id) VALUES (?)',
+        [(user_id,) for user_id in dict.fromkeys(entry[0] for entry in late)]
+    )
+    conn.executemany(_MOVE_LATE_ENTRY, late)
+    conn.executemany(_DELETE_LATE_ENTRY, late)
+
+
+def pending_years(conn, before_year):
+    """Années antérieures à before_year ayant encore des consommations dans consumption"""
+    rows = conn.execute(
+        'SELECT DISTINCT substr(date, 1, 4) FROM consumption WHERE date < ? ORDER BY 1',
+        (f'{before_year:04d}-01-01',)
+    ).fetchall()
+    return [int(row[0]) for row in rows if row[0].isdigit()]
+
+
+def archive_year(conn, year, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Déplacer les consommations d'une année vers l'archive, par lots
+    d'utilisateurs (une transaction par lot : copie, suppression et nouvelle
+    version des données des utilisateurs ensemble). Relançable sans risque.
+    Retourne le nombre de lignes archivées.
+    """
+    start, end = f'{year:04d}-01-01', f'{year:04d}-12-31'
+    user_ids = [row[0] for row in conn.execute(
+        'SELECT DISTINCT user_id FROM consumption WHERE date >= ? AND date <= ?',
+        (start, end)
+    )]
+
+    archived = 0
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        placeholders = ', '.join('?' * len(batch))
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT OR IGNORE INTO archive_users (user_id) VALUES (?)', [(user_id,) for user_id in batch])
+            # Même (utilisateur, jour, heure) déjà archivé : on ajoute, comme l'UPSERT de consumption
+            conn.execute(f'''
+                INSERT INTO archive_consumption (user_key, day, seconds, pints, half_pints, liters_33)
+                SELECT archive_users.key, {_ENCODE_DAY}, {_ENCODE_SECONDS},
+                       COALESCE(consumption.pints, 0), COALESCE(consumption.half_pints, 0),
+                       COALESCE(consumption.liters_33, 0)
+                FROM consumption
+                JOIN archive_users ON archive_users.user_id = consumption.user_id
+                WHERE consumption.user_id IN ({placeholders})
+                  AND consumption.date >= ? AND consumption.date <= ?
+                  AND {_ROUND_TRIP}
+                ON CONFLICT (user_key, day, seconds) DO UPDATE SET
+                    pints = pints + excluded.pints,
+                    half_pints = half_pints + excluded.half_pints,
+                    liters_33 = liters_33 + excluded.liters_33
+            ''', (*batch, start, end))
+            moved = conn.execute(f'''
+                DELETE FROM consumption
+                WHERE user_id IN ({placeholders})
+                  AND date >= ? AND date <= ?
+                  AND {_ROUND_TRIP}
+            ''', (*batch, start, end)).rowcount
+            conn.execute('''
+                INSERT INTO archived_years (year, row_count) VALUES (?, ?)
+                ON CONFLICT (year) DO UPDATE SET
+                    row_count = row_count + excluded.row_count,
+                    archived_at = CURRENT_TIMESTAMP
+            ''', (year, moved))
+            # Les lignes archivées n'ont plus d'id : nouvel ETag pour ces utilisateurs
+            versions.bump_users(conn, batch)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        archived += moved
+
+    return archived
+
+
+def archived_years(conn):
+    """Années archivées : lignes (year, row_count, archived_at)"""
+    return conn.execute('SELECT year, row_count, archived_at FROM archived_years ORDER BY year').fetchall()
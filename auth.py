@@ -1,38 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from flask import session, redirect, url_for
 from flask_bcrypt import Bcrypt
+import threading
+import time
+import uuid
 
 bcrypt = Bcrypt()
 
+# bcrypt est volontairement lent : les calculs passent par un pool de threads
+# borné (bcrypt libère le GIL) plutôt que de s'accumuler dans les threads de
+# requête. Au-delà de BCRYPT_WORKERS calculs en cours et BCRYPT_QUEUE_DEPTH en
+# attente, HashingOverloaded est levée (réponse 503)
+BCRYPT_WORKERS = 2
+BCRYPT_QUEUE_DEPTH = 16
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+# Observateur facultatif (voir set_hashing_observer) : observer(opération, secondes)
+_hashing_observer = None
+# Hash d'un mot de passe aléatoire, pour verify_dummy_password
+_dummy_hash = None
+
+
+class HashingOverloaded(Exception):
+    """Trop de calculs bcrypt en cours ou en attente"""
+
+
+def configure_hashing(workers=None, queue_depth=None, log_rounds=None):
+    """
+    Configurer le pool de calcul bcrypt (recréé au prochain calcul). Avec
+    log_rounds, le hash factice de verify_dummy_password est calculé tout de
+    suite, au coût des nouveaux mots de passe
+    """
+    global BCRYPT_WORKERS, BCRYPT_QUEUE_DEPTH, _executor, _slots, _dummy_hash
+    if log_rounds is not None:
+        _dummy_hash = bcrypt.generate_password_hash(uuid.uuid4().hex, rounds=int(log_rounds)).decode('utf-8')
+    with _executor_lock:
+        if workers is not None:
+            BCRYPT_WORKERS = int(workers)
+        if queue_depth is not None:
+            BCRYPT_QUEUE_DEPTH = int(queue_depth)
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+        _slots = None
+
+
+def set_hashing_observer(observer):
+    """Brancher (ou retirer avec None) l'observateur des durées bcrypt"""
+    global _hashing_observer
+    _hashing_observer = observer
+
+
+def _run_hashing(operation, function, *args):
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+            _slots = threading.BoundedSemaphore(BCRYPT_WORKERS + BCRYPT_QUEUE_DEPTH)
+        executor, slots = _executor, _slots
+
+    if not slots.acquire(blocking=False):
+        raise HashingOverloaded()
+    start = time.perf_counter()
+    try:
+        future = executor.submit(function, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result()
+    finally:
+        # Durée vue par la requête : attente dans la file comprise
+        if _hashing_observer is not None:
+            _hashing_observer(operation, time.perf_counter() - start)
+
 def hash_password(password):
     """Hasher un mot de passe avec bcrypt"""
     clean_password = password.strip()
-    return bcrypt.generate_password_hash(clean_password).decode('utf-8')
+    return _run_hashing('hash', bcrypt.generate_password_hash, clean_password).decode('utf-8')
 
 def verify_password(password, hash):
     """Vérifier un mot de passe"""
     clean_password = password.strip()
-    return bcrypt.check_password_hash(hash, clean_password)
+    return _run_hashing('verify', bcrypt.check_password_hash, hash, clean_password)
+
+def verify_dummy_password(password):
+    """
+    Vérification factice pour un utilisateur inconnu : même coût bcrypt qu'une
+    vraie vérification, la durée de réponse ne révèle pas si le compte existe.
+    Le hash factice est préparé par configure_hashing (create_app), jamais
+    pendant une requête : sinon la première coûterait un hash de plus
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(uuid.uuid4().hex)
+    verify_password(password, _dummy_hash)
+    return False
 
 def verify_user_exists(user_id):
     """Vérifier qu'un utilisateur existe toujours en base de données"""
     from models import Database
-    conn = Database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM users WHERE id = ?', (user_id,))
-    user_exists = cursor.fetchone()
-    conn.close()
-    return user_exists is not None
+    return Database.user_id_exists(user_id)
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
         if not verify_user_exists(session['user_id']):
             session.clear()
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
         return f(*args, **kwargs)
     return decorated_function
@@ -41,14 +123,14 @@ def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not session.get('is_admin'):
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
         if 'user_id' not in session:
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
         if not verify_user_exists(session['user_id']):
             session.clear()
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
         return f(*args, **kwargs)
     return decorated_function
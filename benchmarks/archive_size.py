@@ -0,0 +1,153 @@
+"""
+Taille et vitesse de lecture de l'archive des années closes (archive.py),
+sur une base synthétique :
+
+    python benchmarks/archive_size.py --users 50 --years 3 --entries-per-day 3 --output archive.json
+
+Mesure l'espace occupé (tables et index, via dbstat) et la durée des
+lectures (parcours brut, export complet, historique d'un utilisateur sur une
+année close, première page de l'API) avant puis après archivage de toutes
+les années antérieures à l'année en cours, et vérifie que les lectures
+retournent les mêmes consommations et que les agrégats restent cohérents.
+"""
+from datetime import date
+from pathlib import Path
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from models import Database
+from seed import seed_database
+
+HOT_OBJECTS = ('consumption', 'idx_consumption_user_date', 'idx_consumption_date_user', 'sqlite_autoindex_consumption_1')
+ARCHIVE_OBJECTS = ('archive_consumption', 'archive_users', 'sqlite_autoindex_archive_users_1')
+
+
+def object_bytes(names):
+    """Octets occupés par ces tables et index (pages dbstat)"""
+    conn = Database.get_connection()
+    try:
+        placeholders = ', '.join('?' * len(names))
+        row = conn.execute(f'SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN ({placeholders})', names).fetchone()
+        return row[0]
+    finally:
+        conn.close()
+
+
+def timed(function, repeat):
+    """(meilleure durée en millisecondes, résultat du dernier appel)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 3), result
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def raw_scan(table):
+    conn = Database.get_connection()
+    try:
+        return tuple(conn.execute(
+            f'SELECT COUNT(*), SUM(pints), SUM(half_pints), SUM(liters_33) FROM {table}'
+        ).fetchone())
+    finally:
+        conn.close()
+
+
+def without_id(records):
+    return [tuple(record)[1:] if 'id' in record.keys() else tuple(record) for record in records]
+
+
+def measure_reads(user_id, closed_year, repeat):
+    """Durées des lectures, et leurs résultats pour comparaison"""
+    year_start, year_end = f'{closed_year}-01-01', f'{closed_year}-12-31'
+    readers = {
+        'export_all_users': lambda: [tuple(row) for row in Database.iter_consumption_export()],
+        'export_one_user': lambda: [tuple(row) for row in Database.iter_consumption_export(user_id)],
+        'closed_year_history': lambda: without_id(Database.get_consumption(user_id, year_start, year_end)),
+        'first_api_page': lambda: without_id(Database.get_consumption_page(user_id, limit=100)),
+    }
+    timings, results = {}, {}
+    for name, reader in readers.items():
+        timings[name], results[name] = timed(reader, repeat)
+    return timings, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de l'archive des années closes")
+    parser.add_argument('--users', type=int, default=20, help="utilisateurs synthétiques")
+    parser.add_argument('--years', type=int, default=3, help="années de consommation par utilisateur")
+    parser.add_argument('--entries-per-day', type=int, default=2, help="consommations par jour et par utilisateur")
+    parser.add_argument('--repeat', type=int, default=5, help="répétitions de chaque lecture (meilleure durée retenue)")
+    parser.add_argument('--output', help="fichier JSON du résultat (sortie standard par défaut)")
+    args = parser.parse_args(argv)
+
+    current_year = date.today().year
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'archive.sqlite3')
+        Database.configure(db_path=db_path)
+        Database.init_db()
+        usernames = seed_database(args.users, args.years, args.entries_per_day)
+        user_id = Database.get_user_ids()[usernames[0]]
+
+        before_bytes = object_bytes(HOT_OBJECTS)
+        scan_before_ms, scan_before = timed(lambda: raw_scan('consumption'), args.repeat)
+        reads_before, results_before = measure_reads(user_id, current_year - 1, args.repeat)
+
+        started = time.perf_counter()
+        archived = Database.archive_years(current_year)
+        archive_seconds = time.perf_counter() - started
+
+        after_hot_bytes = object_bytes(HOT_OBJECTS)
+        archive_bytes = object_bytes(ARCHIVE_OBJECTS)
+        scan_after_ms, _ = timed(lambda: raw_scan('archive_consumption'), args.repeat)
+        reads_after, results_after = measure_reads(user_id, current_year - 1, args.repeat)
+
+        archived_rows = sum(archived.values())
+        result = {
+            'commit': current_commit(),
+            'parameters': vars(args),
+            'rows': scan_before[0],
+            'archived_rows': archived_rows,
+            'archive_seconds': round(archive_seconds, 3),
+            'bytes': {
+                'consumption_before': before_bytes,
+                'consumption_after': after_hot_bytes,
+                'archive': archive_bytes,
+                'archive_bytes_per_row': round(archive_bytes / archived_rows, 1) if archived_rows else None,
+                'consumption_bytes_per_row': round(before_bytes / scan_before[0], 1) if scan_before[0] else None,
+            },
+            'raw_scan_ms': {'consumption_all_rows': scan_before_ms, 'archive_archived_rows': scan_after_ms},
+            'reads_ms': {'before': reads_before, 'after': reads_after},
+            'identical_results': {name: results_before[name] == results_after[name] for name in results_before},
+            'rollup_mismatches': len(Database.check_rollups()),
+        }
+        Database.close_pool()
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n', encoding='utf-8')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Benchmark des routes les plus sollicitées, sur une base synthétique.
+
+    python benchmarks/run.py --users 50 --years 2 --entries-per-day 3 --output result.json
+
+Chaque route est mesurée avec le client de test Flask (un seul thread, sans
+réseau) puis avec un serveur HTTP local et --concurrency clients simultanés.
+Le résultat (JSON) donne p50/p95/p99 en millisecondes et le débit en
+requêtes/s, avec le commit mesuré : comparer deux fichiers entre commits.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from pathlib import Path
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Variables obligatoires de config.py, avant tout import de l'application
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('APP_PORT', '0')
+os.environ.setdefault('ADMIN_PASSWORD', 'benchmark-admin')
+
+from werkzeug.serving import make_server
+
+from app import create_app, initialize_database
+from auth import hash_password
+from config import Config
+from models import Database
+from seed import seed_database
+
+USER_PASSWORD = 'benchmark'
+IMPORT_ROWS = 200
+
+
+def percentile(sorted_values, fraction):
+    """Percentile par rang le plus proche, sur des valeurs triées"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(durations, elapsed, errors):
+    durations = sorted(durations)
+    return {
+        'requests': len(durations),
+        'errors': errors,
+        'p50_ms': round(percentile(durations, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(durations, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(durations, 0.99) * 1000, 3),
+        'mean_ms': round(sum(durations) / len(durations) * 1000, 3),
+        'throughput_rps': round(len(durations) / elapsed, 1) if elapsed else None,
+    }
+
+
+def import_csv_payload(username):
+    """Petit fichier d'import admin (format complet : utilisateur en première colonne)"""
+    lines = ['Utilisateur,Date,Heure,Pintes,Demis,33cl']
+    for index in range(IMPORT_ROWS):
+        lines.append(f"{username},2000-01-01,{index // 3600:02d}:{index // 60 % 60:02d}:{index % 60:02d},1,0,0")
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def scenarios(username):
+    """(nom, rôle, méthode, chemin, corps JSON ou fichier) des routes mesurées"""
+    return [
+        ('GET /api/consumption', 'user', 'GET', '/api/consumption', None),
+        ('POST /api/consumption', 'user', 'POST', '/api/consumption',
+         {'json': {'date': '2000-01-02', 'time': '12:00:00', 'pints': 1}}),
+        ('GET /dashboard', 'user', 'GET', '/dashboard', None),
+        ('GET /api/export', 'user', 'GET', '/api/export', None),
+        ('GET /admin', 'admin', 'GET', '/admin', None),
+        ('POST /admin/import', 'admin', 'POST', '/admin/import',
+         {'file': import_csv_payload(username)}),
+    ]
+
+
+class BenchmarkConfig(Config):
+    # Coût bcrypt minimal : on mesure l'application, pas bcrypt
+    BCRYPT_LOG_ROUNDS = 4
+    WTF_CSRF_ENABLED = False
+    # POST /admin/import mesure le dépôt du fichier : les imports restent en
+    # attente au lieu de s'exécuter pendant les mesures suivantes
+    JOB_WORKERS = 0
+
+
+def build_app(db_path, args):
+    BenchmarkConfig.DATABASE_PATH = db_path
+    BenchmarkConfig.JOBS_DIR = str(Path(db_path).parent / 'jobs')
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        initialize_database()
+        password_hash = hash_password(USER_PASSWORD)
+        started = time.perf_counter()
+        usernames = seed_database(args.users, args.years, args.entries_per_day, password_hash)
+        seed_seconds = time.perf_counter() - started
+    return app, usernames, seed_seconds
+
+
+def run_test_client(app, username, requests_per_endpoint):
+    """Mesures en série via le client de test Flask"""
+    clients = {'user': app.test_client(), 'admin': app.test_client()}
+    clients['user'].post('/login', data={'username': username, 'password': USER_PASSWORD})
+    clients['admin'].post('/login', data={'username': app.config['ADMIN_USERNAME'], 'password': app.config['ADMIN_PASSWORD']})
+
+    results = {}
+    for name, role, method, path, body in scenarios(username):
+        client = clients[role]
+        durations = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(requests_per_endpoint):
+            kwargs = {}
+            if body and 'json' in body:
+                kwargs['json'] = body['json']
+            elif body and 'file' in body:
+                kwargs['data'] = {'file': (io.BytesIO(body['file']), 'import.csv')}
+                kwargs['content_type'] = 'multipart/form-data'
+            request_started = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            response.get_data()
+            durations.append(time.perf_counter() - request_started)
+            if response.status_code >= 400:
+                errors += 1
+        results[name] = summarize(durations, time.perf_counter() - started, errors)
+    return results
+
+
+def _http_opener(base_url, username, password):
+    """Client urllib avec cookie de session, connecté en tant que username"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    data = urllib.parse.urlencode({'username': username, 'password': password}).encode('utf-8')
+    opener.open(f"{base_url}/login", data=data).read()
+    return opener
+
+
+def _http_request(base_url, method, path, body):
+    headers = {}
+    data = None
+    if body and 'json' in body:
+        data = json.dumps(body['json']).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    elif body and 'file' in body:
+        boundary = 'benchmark-boundary'
+        data = (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="import.csv"\r\n'
+            "Content-Type: text/csv\r\n\r\n"
+        ).encode('utf-8') + body['file'] + f"\r\n--{boundary}--\r\n".encode('utf-8')
+        headers['Content-Type'] = f"multipart/form-data; boundary={boundary}"
+    return urllib.request.Request(f"{base_url}{path}", data=data, headers=headers, method=method)
+
+
+def run_http(app, username, requests_per_endpoint, concurrency):
+    """Mesures via un vrai serveur HTTP local (multi-thread) et des clients concurrents"""
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        # Un client (donc une session) par thread
+        local = threading.local()
+
+        def opener_for(role):
+            if not hasattr(local, role):
+                if role == 'admin':
+                    opener = _http_opener(base_url, app.config['ADMIN_USERNAME'], app.config['ADMIN_PASSWORD'])
+                else:
+                    opener = _http_opener(base_url, username, USER_PASSWORD)
+                setattr(local, role, opener)
+            return getattr(local, role)
+
+        results = {}
+        for name, role, method, path, body in scenarios(username):
+            def one_request(_):
+                opener = opener_for(role)
+                request_started = time.perf_counter()
+                try:
+                    with opener.open(_http_request(base_url, method, path, body)) as response:
+                        response.read()
+                    failed = False
+                except urllib.error.HTTPError as e:
+                    e.read()
+                    failed = True
+                return time.perf_counter() - request_started, failed
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                # Connexion des clients hors mesure
+                list(executor.map(lambda _: opener_for(role), range(concurrency)))
+                started = time.perf_counter()
+                outcomes = list(executor.map(one_request, range(requests_per_endpoint)))
+                elapsed = time.perf_counter() - started
+            results[name] = summarize(
+                [duration for duration, _ in outcomes],
+                elapsed,
+                sum(1 for _, failed in outcomes if failed)
+            )
+        return results
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark des routes HTTP de BeerTracker")
+    parser.add_argument('--users', type=int, default=20, help="utilisateurs synthétiques")
+    parser.add_argument('--years', type=int, default=2, help="années de consommation par utilisateur")
+    parser.add_argument('--entries-per-day', type=int, default=2, help="consommations par jour et par utilisateur")
+    parser.add_argument('--requests', type=int, default=200, help="requêtes par route et par mode")
+    parser.add_argument('--concurrency', type=int, default=8, help="clients simultanés du mode HTTP")
+    parser.add_argument('--mode', choices=['client', 'http', 'both'], default='both')
+    parser.add_argument('--output', help="fichier JSON du résultat (sortie standard par défaut)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app, usernames, seed_seconds = build_app(str(Path(directory) / 'benchmark.sqlite3'), args)
+        result = {
+            'commit': current_commit(),
+            'parameters': vars(args),
+            'seed_seconds': round(seed_seconds, 3),
+            'results': {},
+        }
+        if args.mode in ('client', 'both'):
+            result['results']['test_client'] = run_test_client(app, usernames[0], args.requests)
+        if args.mode in ('http', 'both'):
+            result['results']['http'] = run_http(app, usernames[0], args.requests, args.concurrency)
+        Database.close_pool()
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n', encoding='utf-8')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Génération d'une base SQLite synthétique pour les benchmarks :
+users utilisateurs × years années × entries_per_day consommations par jour.
+Données déterministes (graine fixe) : deux exécutions produisent la même base.
+"""
+from datetime import date, timedelta
+import random
+
+from models import Database
+
+SEED = 42
+
+
+def seed_database(users=20, years=2, entries_per_day=2, password_hash='x', seed=SEED, end_date=None):
+    """
+    Remplir la base configurée (Database.configure) et retourner la liste
+    des noms d'utilisateurs créés. La base doit être initialisée (init_db).
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    start_date = end_date - timedelta(days=365 * years - 1)
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+    usernames = [f"bench{index:04d}" for index in range(users)]
+    for username in usernames:
+        Database.create_user(username, password_hash)
+    user_ids = Database.get_user_ids()
+
+    for username in usernames:
+        user_id = user_ids[username]
+        entries = []
+        for day in days:
+            # Heures distinctes dans la journée : pas de fusion par l'UPSERT
+            for minute in sorted(rng.sample(range(18 * 60, 24 * 60), entries_per_day)):
+                entries.append((
+                    user_id,
+                    day.isoformat(),
+                    f"{minute // 60:02d}:{minute % 60:02d}:00",
+                    rng.randint(0, 2),
+                    rng.randint(0, 1),
+                    rng.randint(0, 1)
+                ))
+        Database.add_consumption_batch(entries)
+
+    return usernames
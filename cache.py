@@ -0,0 +1,169 @@
+from collections import OrderedDict
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """Cache LRU dans la mémoire du processus (backend par défaut)"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SocketBackend:
+    """
+    Cache partagé entre les workers via un serveur local (socket Unix, voir
+    serve()). Si le serveur est injoignable, le cache se comporte comme vide :
+    les classements sont recalculés, l'application continue de fonctionner.
+    """
+
+    def __init__(self, path, timeout=0.5):
+        self.path = path
+        self.timeout = timeout
+
+    def _request(self, message):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(self.timeout)
+                client.connect(self.path)
+                client.sendall(json.dumps(message).encode('utf-8') + b'\n')
+                with client.makefile('rb') as reader:
+                    return json.loads(reader.readline() or b'{}')
+        except (OSError, ValueError) as e:
+            logger.warning("Serveur de cache injoignable (%s) : %s", self.path, e)
+            return {}
+
+    def get(self, key):
+        return self._request({'op': 'get', 'key': key}).get('value')
+
+    def set(self, key, value, ttl):
+        self._request({'op': 'set', 'key': key, 'value': value, 'ttl': ttl})
+
+    def clear(self):
+        self._request({'op': 'clear'})
+
+
+class _CacheRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        backend = self.server.backend
+        for line in self.rfile:
+            message = json.loads(line)
+            op = message.get('op')
+            if op == 'get':
+                response = {'value': backend.get(message['key'])}
+            elif op == 'set':
+                backend.set(message['key'], message['value'], message['ttl'])
+                response = {}
+            elif op == 'clear':
+                backend.clear()
+                response = {}
+            else:
+                response = {'error': f"opération inconnue: {op}"}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+def serve(path, max_entries=128):
+    """
+    Lancer le serveur de cache partagé sur un socket Unix (bloquant). Le
+    socket n'est accessible qu'à l'utilisateur du serveur (0600, dans un
+    répertoire créé en 0700) : les autres comptes locaux ne peuvent ni lire
+    ni remplacer les classements
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+
+    # umask pendant bind() : le socket n'est jamais ouvert aux autres, même un instant
+    previous_umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(path, _CacheRequestHandler)
+    finally:
+        os.umask(previous_umask)
+    os.chmod(path, 0o600)
+    server.daemon_threads = True
+    server.backend = MemoryBackend(max_entries)
+    logger.info("Serveur de cache en écoute sur %s", path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+def create_backend(name, socket_path=None, max_entries=128):
+    """Construire le backend de cache configuré ('memory' ou 'socket')"""
+    if name == 'memory':
+        return MemoryBackend(max_entries)
+    if name == 'socket':
+        return SocketBackend(socket_path)
+    raise ValueError(f"Backend de cache inconnu: {name}")
+
+
+class LeaderboardCache:
+    """
+    Cache des classements, identiques pour tous les utilisateurs : expiration
+    après ttl secondes, ou invalidation explicite après chaque écriture.
+    Les valeurs doivent être sérialisables en JSON (backend socket).
+    """
+
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        value = self.backend.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+        value = compute()
+        self.backend.set(key, value, self.ttl)
+        return value
+
+    def invalidate(self):
+        """Oublier tous les classements (consommation ajoutée, import, suppression...)"""
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
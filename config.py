@@ -13,7 +13,81 @@ class Config:
     if not APP_PORT:
         raise RuntimeError("APP_PORT must be set")
     
+    # Serveur de production (gunicorn.conf.py) : processus et threads par processus
+    WEB_WORKERS = int(os.environ.get("WEB_WORKERS", "2"))
+    WEB_THREADS = int(os.environ.get("WEB_THREADS", "4"))
+    WEB_GRACEFUL_TIMEOUT = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "30"))
+
+    # Chemin de la base SQLite, ou URI "file:..." (ex: base en mémoire pour les tests)
+    DATABASE_PATH = os.environ.get("DATABASE_PATH", "/app/data/db.sqlite3")
+
+    # Compte admin créé / mis à jour par `flask --app app init-db`
+    ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
+    ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD")
+
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SECURE = os.environ.get("USE_HTTPS", "0") == "1"
     
     PERMANENT_SESSION_LIFETIME = 86400 * 3
+
+    # Coût bcrypt (2^n itérations) des nouveaux mots de passe ; les hash
+    # existants restent vérifiables quel que soit leur coût
+    BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", "12"))
+    # Calculs bcrypt simultanés, et en attente avant de répondre 503
+    BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", "2"))
+    BCRYPT_QUEUE_DEPTH = int(os.environ.get("BCRYPT_QUEUE_DEPTH", "16"))
+
+    # Nombre de semaines affichées dans le graphique hebdomadaire
+    WEEKLY_STATS_WEEKS = int(os.environ.get("WEEKLY_STATS_WEEKS", "4"))
+
+    # Enregistrements par page de GET /api/consumption (paramètre limit), et maximum accepté
+    CONSUMPTION_PAGE_SIZE = int(os.environ.get("CONSUMPTION_PAGE_SIZE", "100"))
+    CONSUMPTION_MAX_PAGE_SIZE = int(os.environ.get("CONSUMPTION_MAX_PAGE_SIZE", "1000"))
+
+    # Nombre maximal d'entrées par appel à POST /api/consumption/batch
+    CONSUMPTION_BATCH_MAX = int(os.environ.get("CONSUMPTION_BATCH_MAX", "500"))
+
+    # Nombre de lignes par page du classement dans l'administration
+    RANKING_PAGE_SIZE = int(os.environ.get("RANKING_PAGE_SIZE", "50"))
+
+    # Tâches de fond (imports / exports admin) : fichiers déposés et produits,
+    # threads d'exécution par processus (0 : seulement `flask --app app run-jobs`),
+    # délai avant de déclarer perdue une tâche sans nouvelles, durée de conservation
+    JOBS_DIR = os.environ.get("JOBS_DIR", "/app/data/jobs")
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+    JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "2"))
+    JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "300"))
+    JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", "7"))
+
+    # `flask --app app archive-years` garde dans la table principale l'année
+    # en cours et ce nombre d'années précédentes, et archive les autres
+    ARCHIVE_KEEP_YEARS = int(os.environ.get("ARCHIVE_KEEP_YEARS", "1"))
+
+    # Cache des classements : "memory" (par processus) ou "socket" (partagé
+    # entre workers via `flask --app app cache-server`, socket réservé à
+    # l'utilisateur de l'application, dans le répertoire des données)
+    LEADERBOARD_CACHE_BACKEND = os.environ.get("LEADERBOARD_CACHE_BACKEND", "memory")
+    LEADERBOARD_CACHE_SOCKET = os.environ.get("LEADERBOARD_CACHE_SOCKET", "/app/data/run/cache.sock")
+    LEADERBOARD_CACHE_TTL = int(os.environ.get("LEADERBOARD_CACHE_TTL", "60"))
+    LEADERBOARD_CACHE_SIZE = int(os.environ.get("LEADERBOARD_CACHE_SIZE", "128"))
+
+    # Nombre maximal de connexions SQLite conservées dans le pool
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+
+    # Durée (secondes) pendant laquelle un utilisateur vérifié n'est plus relu
+    # en base ; une suppression reste immédiate dans le processus qui l'effectue
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", "30"))
+
+    # Requêtes SQL journalisées comme lentes au-delà de ce seuil (millisecondes)
+    SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", "100"))
+
+    # Profil de PRAGMA SQLite appliqué à chaque connexion (WAL : lecteurs et
+    # écrivain ne se bloquent plus mutuellement)
+    DB_PRAGMAS = {
+        "journal_mode": os.environ.get("DB_JOURNAL_MODE", "WAL"),
+        "synchronous": os.environ.get("DB_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.environ.get("DB_BUSY_TIMEOUT", "5000")),
+        "cache_size": int(os.environ.get("DB_CACHE_SIZE", "-16000")),
+        "mmap_size": int(os.environ.get("DB_MMAP_SIZE", "134217728")),
+        "temp_store": os.environ.get("DB_TEMP_STORE", "MEMORY"),
+    }
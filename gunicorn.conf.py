@@ -0,0 +1,30 @@
+# Configuration gunicorn : gunicorn -c gunicorn.conf.py "app:create_app()"
+# Rechargement sans coupure (nouveau code, nouveaux workers) : kill -HUP <pid du maître>
+import subprocess
+import sys
+from config import Config
+
+bind = f"0.0.0.0:{Config.APP_PORT}"
+workers = Config.WEB_WORKERS
+threads = Config.WEB_THREADS
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+accesslog = "-"
+
+
+def init_db():
+    # Dans un processus à part : le maître n'importe pas l'application, un
+    # rechargement (HUP) relit donc bien le code, et les workers n'héritent
+    # d'aucune connexion SQLite
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"], check=True)
+
+
+def on_starting(server):
+    """Migrations et compte admin, une seule fois avant le lancement des workers"""
+    init_db()
+
+
+def on_reload(server):
+    """Rechargement (HUP) : migrations du nouveau code avant ses nouveaux workers"""
+    # En cas d'échec, gunicorn s'arrête plutôt que de servir le nouveau code
+    # sur l'ancien schéma
+    init_db()
@@ -16,6 +16,11 @@ TRANSLATIONS = {
         "admin_import_users_created": "Utilisateurs créés: {count}",
         "admin_import_important": "IMPORTANT: Changez ces mots de passe par défaut !",
         "admin_import_errors": "Erreurs: {count}",
+        "admin_import_queued": "Import lancé en arrière-plan, suivez son avancement ci-dessous",
+        "admin_export_queued": "Export lancé en arrière-plan, le fichier sera téléchargeable ci-dessous",
+        "admin_job_failed": "Échec de la tâche: {error}",
+        "admin_job_not_resumable": "Cette tâche ne peut pas être reprise",
+        "admin_import_resumed": "Repris après la ligne {count}",
         "night_mode_enabled": "Mode soirée activé",
         "night_mode_disabled": "Mode soirée désactivé",
         "password_all_fields_required": "Tous les champs sont requis",
@@ -23,6 +28,7 @@ TRANSLATIONS = {
         "password_too_short": "Le mot de passe doit contenir au moins 6 caractères",
         "password_current_incorrect": "Mot de passe actuel incorrect",
         "password_changed_success": "Mot de passe modifié avec succès",
+        "server_busy": "Serveur occupé, veuillez réessayer dans un instant",
     },
     "en": {
         "login_incorrect_password": "Incorrect password",
@@ -36,6 +42,11 @@ TRANSLATIONS = {
         "admin_import_users_created": "Users created: {count}",
         "admin_import_important": "IMPORTANT: Change these default passwords!",
         "admin_import_errors": "Errors: {count}",
+        "admin_import_queued": "Import started in the background, follow its progress below",
+        "admin_export_queued": "Export started in the background, the file will be downloadable below",
+        "admin_job_failed": "Job failed: {error}",
+        "admin_job_not_resumable": "This job cannot be resumed",
+        "admin_import_resumed": "Resumed after row {count}",
         "night_mode_enabled": "Night mode enabled",
         "night_mode_disabled": "Night mode disabled",
         "password_all_fields_required": "All fields are required",
@@ -43,6 +54,7 @@ TRANSLATIONS = {
         "password_too_short": "Password must contain at least 6 characters",
         "password_current_incorrect": "Current password is incorrect",
         "password_changed_success": "Password changed successfully",
+        "server_busy": "Server busy, please try again in a moment",
     },
 }
 
@@ -58,7 +70,7 @@ def detect_language_from_header(header_value):
 
 
 def get_request_language():
-    if request.endpoint in {"login", "change_password"}:
+    if request.endpoint in {"main.login", "main.change_password"}:
         return detect_language_from_header(request.headers.get("Accept-Language", ""))
 
     cookie_lang = request.cookies.get("lang", "").lower()
@@ -0,0 +1,150 @@
+from jobs import JobLost
+from models import Database
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Intervalle minimal (secondes) entre deux écritures de l'avancement d'une tâche
+PROGRESS_INTERVAL = 1.0
+# Intervalle (secondes) entre deux purges des tâches terminées anciennes
+PURGE_INTERVAL = 3600
+
+
+class ProgressReporter:
+    """
+    Passé au gestionnaire d'une tâche : report(progress, total=None).
+    Les écritures en base sont espacées d'au moins PROGRESS_INTERVAL,
+    sauf la première et tout changement de total. Lève JobLost si la tâche
+    n'est plus running.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.value = 0
+        self._written_at = None
+
+    def __call__(self, progress, total=None):
+        self.value = progress
+        now = time.monotonic()
+        if total is None and self._written_at is not None and now - self._written_at < PROGRESS_INTERVAL:
+            return
+        self._written_at = now
+        if not Database.report_job_progress(self.job_id, progress, total):
+            raise JobLost(self.job_id)
+
+
+class JobRunner:
+    """
+    Exécute les tâches de la table jobs (voir jobs.py) dans des threads du
+    processus courant. handlers : {type de tâche: fonction(job, report)}
+    retournant (résultat JSON, chemin du fichier produit ou None), appelée
+    dans un contexte de l'application.
+    """
+
+    def __init__(self, app, handlers, workers=1, poll_interval=2, stale_seconds=300, retention_days=7):
+        self.app = app
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self.retention_days = retention_days
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._purged_at = None
+
+    def start(self, workers=None):
+        """Lancer les threads une seule fois par processus (sans effet si workers vaut 0)"""
+        workers = self.workers if workers is None else workers
+        if self._threads or not workers:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(workers):
+                thread = threading.Thread(target=self._loop, name=f'job-runner-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def notify(self):
+        """Une tâche vient d'être déposée : ne pas attendre le prochain tour"""
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_pending(self):
+        """Exécuter les tâches en attente jusqu'à ce que la file soit vide"""
+        count = 0
+        while not self._stop.is_set():
+            # Chaque worker web interroge la file toutes les poll_interval
+            # secondes : une lecture simple d'abord, le verrou d'écriture
+            # (BEGIN IMMEDIATE de claim_job) seulement s'il y a du travail
+            if not Database.has_pending_jobs(self.stale_seconds):
+                break
+            job = Database.claim_job(self.stale_seconds)
+            if job is None:
+                break
+            self._run(job)
+            count += 1
+        return count
+
+    def purge(self):
+        """Supprimer les tâches terminées depuis plus de retention_days jours, et leurs fichiers"""
+        for path in Database.delete_expired_jobs(self.retention_days):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._purge_if_due()
+                self.run_pending()
+            except Exception:
+                logger.exception("Erreur de la file des tâches de fond")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _purge_if_due(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._purged_at is not None and now - self._purged_at < PURGE_INTERVAL:
+                return
+            self._purged_at = now
+        self.purge()
+
+    def _run(self, job):
+        handler = self.handlers.get(job['kind'])
+        if handler is None:
+            Database.fail_job(job['id'], f"unknown job kind: {job['kind']}")
+            return
+
+        logger.info("Tâche %s (%s) démarrée", job['id'], job['kind'])
+        report = ProgressReporter(job['id'])
+        try:
+            with self.app.app_context():
+                result, result_path = handler(job, report)
+        except JobLost:
+            logger.warning("Tâche %s (%s) déclarée perdue, abandonnée", job['id'], job['kind'])
+        except Exception as e:
+            logger.exception("Tâche %s (%s) en échec", job['id'], job['kind'])
+            Database.fail_job(job['id'], str(e))
+        else:
+            if Database.finish_job(job['id'], result, result_path, report.value):
+                logger.info("Tâche %s (%s) terminée", job['id'], job['kind'])
+                return
+            logger.warning("Tâche %s (%s) déclarée perdue avant la fin, résultat ignoré", job['id'], job['kind'])
+            if result_path:
+                try:
+                    os.remove(result_path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,222 @@
+# Tâches de fond de l'administration (imports et exports CSV) : la table jobs
+# sert de file d'attente partagée par tous les processus, sans broker externe.
+# Une tâche passe de queued à running (réclamée par un seul processus, sous
+# BEGIN IMMEDIATE) puis à done ou failed. updated_at sert de battement de
+# cœur : une tâche running qui n'avance plus est celle d'un processus disparu.
+import json
+import uuid
+
+IMPORT = 'import'
+EXPORT = 'export'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+FINISHED = (DONE, FAILED)
+
+_COLUMNS = '''
+    id, kind, status, created_by, input_path, result_path, result, error,
+    progress, total, checkpoint, created_at, started_at, updated_at, finished_at
+'''
+
+
+class JobLost(Exception):
+    """La tâche n'est plus running (déclarée perdue par un autre processus) : abandonner"""
+
+
+def create_tables(conn):
+    """Créer la table des tâches de fond"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            created_by TEXT,
+            input_path TEXT,
+            result_path TEXT,
+            result TEXT,
+            error TEXT,
+            progress INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    # File d'attente (status, created_at) et purge des tâches terminées
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)')
+
+
+def add_checkpoint(conn):
+    """Ajouter le point de reprise des imports (lignes du fichier déjà validées)"""
+    conn.execute('ALTER TABLE jobs ADD COLUMN checkpoint INTEGER NOT NULL DEFAULT 0')
+
+
+def _as_dict(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def create(conn, kind, created_by=None, input_path=None, total=None):
+    """Mettre une tâche en attente ; retourne son identifiant"""
+    job_id = str(uuid.uuid4())
+    conn.execute(
+        'INSERT INTO jobs (id, kind, created_by, input_path, total) VALUES (?, ?, ?, ?, ?)',
+        (job_id, kind, created_by, input_path, total)
+    )
+    return job_id
+
+
+def fail_stale(conn, stale_seconds):
+    """Marquer en échec les tâches running sans nouvelles depuis stale_seconds"""
+    return conn.execute(
+        '''
+        UPDATE jobs
+        SET status = ?, error = 'interrupted', finished_at = CURRENT_TIMESTAMP,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE status = ? AND updated_at < datetime('now', ?)
+        ''',
+        (FAILED, RUNNING, f'-{int(stale_seconds)} seconds')
+    ).rowcount
+
+
+def has_pending(conn, stale_seconds):
+    """
+    Lecture seule, sans verrou d'écriture : une tâche attend-elle d'être
+    réclamée, ou une tâche running est-elle sans nouvelles depuis stale_seconds ?
+    """
+    return bool(conn.execute(
+        '''
+        SELECT EXISTS (SELECT 1 FROM jobs WHERE status = ?)
+            OR EXISTS (SELECT 1 FROM jobs WHERE status = ? AND updated_at < datetime('now', ?))
+        ''',
+        (QUEUED, RUNNING, f'-{int(stale_seconds)} seconds')
+    ).fetchone()[0])
+
+
+def claim(conn):
+    """
+    Réclamer la plus ancienne tâche en attente, dans la transaction d'écriture
+    de l'appelant (BEGIN IMMEDIATE : deux processus ne réclament jamais la même)
+    """
+    row = conn.execute(
+        'SELECT id FROM jobs WHERE status = ? ORDER BY created_at, rowid LIMIT 1',
+        (QUEUED,)
+    ).fetchone()
+    if row is None:
+        return None
+    conn.execute(
+        '''
+        UPDATE jobs
+        SET status = ?, started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        ''',
+        (RUNNING, row[0])
+    )
+    return get(conn, row[0])
+
+
+# report_progress, finish et fail ne modifient qu'une tâche encore running et
+# retournent False sinon : une tâche déclarée perdue par fail_stale (processus
+# trop lent) ne repasse jamais à done
+
+def report_progress(conn, job_id, progress, total=None):
+    """Avancement (et battement de cœur) d'une tâche en cours"""
+    return conn.execute(
+        '''
+        UPDATE jobs
+        SET progress = ?, total = COALESCE(?, total), updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = ?
+        ''',
+        (progress, total, job_id, RUNNING)
+    ).rowcount == 1
+
+
+def checkpoint(conn, job_id, rows):
+    """
+    Point de reprise d'une tâche en cours, dans la transaction qui valide ces
+    lignes : une reprise (resume) ne les rejoue jamais. False si la tâche
+    n'est plus running (l'appelant annule alors sa transaction)
+    """
+    return conn.execute(
+        '''
+        UPDATE jobs SET checkpoint = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = ?
+        ''',
+        (rows, job_id, RUNNING)
+    ).rowcount == 1
+
+
+def finish(conn, job_id, result=None, result_path=None, progress=None):
+    return conn.execute(
+        '''
+        UPDATE jobs
+        SET status = ?, result = ?, result_path = ?, progress = COALESCE(?, progress),
+            finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = ?
+        ''',
+        (DONE, json.dumps(result) if result is not None else None, result_path, progress, job_id, RUNNING)
+    ).rowcount == 1
+
+
+def fail(conn, job_id, error):
+    return conn.execute(
+        '''
+        UPDATE jobs
+        SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = ?
+        ''',
+        (FAILED, error, job_id, RUNNING)
+    ).rowcount == 1
+
+
+def resume(conn, job_id):
+    """Remettre en attente un import en échec ; il reprendra après son point de reprise"""
+    return conn.execute(
+        '''
+        UPDATE jobs
+        SET status = ?, error = NULL, started_at = NULL, finished_at = NULL,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND kind = ? AND status = ?
+        ''',
+        (QUEUED, job_id, IMPORT, FAILED)
+    ).rowcount == 1
+
+
+def get(conn, job_id):
+    return _as_dict(conn.execute(f'SELECT {_COLUMNS} FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+
+def recent(conn, limit):
+    """Dernières tâches, les plus récentes d'abord"""
+    rows = conn.execute(
+        f'SELECT {_COLUMNS} FROM jobs ORDER BY created_at DESC, rowid DESC LIMIT ?',
+        (limit,)
+    ).fetchall()
+    return [_as_dict(row) for row in rows]
+
+
+def delete_expired(conn, retention_days):
+    """
+    Supprimer les tâches terminées depuis plus de retention_days jours et
+    retourner les chemins de fichiers à effacer (entrée et résultat)
+    """
+    cutoff = f'-{int(retention_days)} days'
+    rows = conn.execute(
+        '''
+        SELECT input_path, result_path FROM jobs
+        WHERE status IN (?, ?) AND finished_at < datetime('now', ?)
+        ''',
+        (*FINISHED, cutoff)
+    ).fetchall()
+    conn.execute(
+        "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < datetime('now', ?)",
+        (*FINISHED, cutoff)
+    )
+    return [path for row in rows for path in row if path]
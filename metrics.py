@@ -0,0 +1,194 @@
+from flask import current_app, g, has_request_context, request
+from auth import set_hashing_observer
+from models import Database
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Métriques au format texte Prometheus, propres à chaque processus : avec
+# plusieurs workers, chaque réponse de /metrics ne couvre que le worker qui
+# l'a servie
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # labels -> [compteurs par tranche (non cumulés), somme, nombre]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels(self.label_names, labels, ('le', _format_value(bound)))
+                    lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+                series_labels = _format_labels(self.label_names, labels)
+                lines.append(f'{self.name}_sum{series_labels} {_format_value(total)}')
+                lines.append(f'{self.name}_count{series_labels} {count}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'beertracker_request_duration_seconds', "Durée des requêtes HTTP",
+    ('endpoint', 'method', 'status')
+)
+REQUEST_QUERIES = Histogram(
+    'beertracker_request_db_queries', "Requêtes SQL par requête HTTP",
+    ('endpoint',), COUNT_BUCKETS
+)
+REQUEST_CONNECTIONS = Histogram(
+    'beertracker_request_db_connections', "Connexions empruntées au pool par requête HTTP",
+    ('endpoint',), COUNT_BUCKETS
+)
+QUERY_SECONDS = Histogram(
+    'beertracker_db_query_duration_seconds', "Durée d'exécution des requêtes SQL",
+    ('statement',)
+)
+SLOW_QUERIES = Counter(
+    'beertracker_db_slow_queries_total', "Requêtes SQL au-delà de SLOW_QUERY_MS",
+    ('statement',)
+)
+BCRYPT_SECONDS = Histogram(
+    'beertracker_bcrypt_duration_seconds', "Durée des calculs bcrypt, attente comprise",
+    ('operation',)
+)
+
+ALL_METRICS = (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_CONNECTIONS, QUERY_SECONDS, SLOW_QUERIES, BCRYPT_SECONDS)
+
+# Seuil (millisecondes) du journal des requêtes lentes, voir init_app()
+SLOW_QUERY_MS = 100
+
+
+def _statement_kind(sql):
+    words = sql.split(None, 1)
+    return words[0].upper() if words else ''
+
+
+def _on_query(sql, seconds):
+    kind = _statement_kind(sql)
+    QUERY_SECONDS.observe(seconds, kind)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(kind)
+        logger.warning("Requête SQL lente (%.1f ms) : %s", seconds * 1000, ' '.join(sql.split()))
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+
+
+def _on_connection():
+    if has_request_context() and 'metrics_connections' in g:
+        g.metrics_connections += 1
+
+
+def _on_hashing(operation, seconds):
+    BCRYPT_SECONDS.observe(seconds, operation)
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_connections = 0
+
+
+def _after_request(response):
+    if 'metrics_start' not in g:
+        return response
+    endpoint = request.endpoint or 'not_found'
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - g.metrics_start,
+        endpoint, request.method, str(response.status_code)
+    )
+    REQUEST_QUERIES.observe(g.metrics_queries, endpoint)
+    REQUEST_CONNECTIONS.observe(g.metrics_connections, endpoint)
+    return response
+
+
+def init_app(app):
+    """Brancher les mesures : hooks Flask, requêtes SQL et calculs bcrypt"""
+    global SLOW_QUERY_MS
+    SLOW_QUERY_MS = app.config['SLOW_QUERY_MS']
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    Database.set_observers(query=_on_query, connection=_on_connection)
+    set_hashing_observer(_on_hashing)
+
+
+def render():
+    """Toutes les métriques au format texte Prometheus"""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+
+    cache_stats = current_app.extensions['leaderboard_cache'].stats()
+    for name, documentation in (
+        ('hits', "Classements servis depuis le cache"),
+        ('misses', "Classements recalculés (absents du cache)"),
+    ):
+        metric_name = f'beertracker_leaderboard_cache_{name}_total'
+        lines.append(f'# HELP {metric_name} {documentation}')
+        lines.append(f'# TYPE {metric_name} counter')
+        lines.append(f'{metric_name} {cache_stats[name]}')
+
+    return '\n'.join(lines) + '\n'
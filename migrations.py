@@ -0,0 +1,131 @@
+from collections import namedtuple
+import applied
+import archive
+import jobs
+import logging
+import rollups
+import versions
+
+logger = logging.getLogger(__name__)
+
+# apply(conn) modifie le schéma dans une transaction ; backfill(conn), facultatif,
+# remplit les données ensuite par lots. Une migration avec backfill n'est
+# enregistrée qu'une fois le remplissage terminé : apply et backfill doivent
+# donc pouvoir être relancés sans risque, après une interruption comme par un
+# second processus qui démarre pendant le remplissage
+Migration = namedtuple('Migration', ['version', 'description', 'apply', 'backfill'])
+
+
+def _create_base_tables(conn):
+    # Table utilisateurs avec UUID comme clé primaire
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            is_admin INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            night_mode_until TIMESTAMP DEFAULT NULL
+        )
+    ''')
+
+    # Table consommation avec user_id en TEXT pour UUID
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS consumption (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            date DATE NOT NULL,
+            time TIME NOT NULL DEFAULT '00:00:00',
+            pints INTEGER DEFAULT 0,
+            half_pints INTEGER DEFAULT 0,
+            liters_33 INTEGER DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            UNIQUE(user_id, date, time)
+        )
+    ''')
+
+
+def _create_consumption_indexes(conn):
+    # Index couvrants : historique d'un utilisateur (user_id, date) et
+    # classements sur une période (date d'abord), sans relire la table
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_consumption_user_date
+        ON consumption (user_id, date, time, pints, half_pints, liters_33)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_consumption_date_user
+        ON consumption (date, user_id, pints, half_pints, liters_33)
+    ''')
+
+
+# Liste ordonnée : ne jamais modifier une migration publiée, en ajouter une nouvelle
+MIGRATIONS = [
+    Migration(1, "Tables users et consumption", _create_base_tables, None),
+    Migration(2, "Index couvrants sur consumption", _create_consumption_indexes, None),
+    Migration(3, "Agrégats journaliers et mensuels", rollups.create_tables, rollups.rebuild),
+    Migration(4, "Versions des données (ETag)", versions.create_tables, None),
+    Migration(5, "Tâches de fond (imports et exports)", jobs.create_tables, None),
+    Migration(6, "Archive compacte des années closes", archive.create_tables, None),
+    Migration(7, "Point de reprise des imports", jobs.add_checkpoint, None),
+    Migration(8, "Entrées déjà appliquées des files clients", applied.create_tables, None),
+]
+
+
+def current_version(conn):
+    """Version actuelle du schéma (0 pour une base vierge)"""
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def _record_version(conn, migration):
+    # OR IGNORE : un autre processus a pu terminer le même remplissage avant nous
+    conn.execute(
+        'INSERT OR IGNORE INTO schema_version (version, description) VALUES (?, ?)',
+        (migration.version, migration.description)
+    )
+
+
+def apply_migrations(conn, migrations=None):
+    """Appliquer, dans l'ordre, les migrations pas encore passées sur cette base"""
+    migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+    for migration in migrations:
+        # BEGIN IMMEDIATE puis relecture de la version : si plusieurs processus
+        # démarrent en même temps, un seul applique chaque migration
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if current_version(conn) >= migration.version:
+                conn.rollback()
+                continue
+
+            logger.info("Migration %s : %s", migration.version, migration.description)
+            migration.apply(conn)
+            if migration.backfill is None:
+                _record_version(conn, migration)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        if migration.backfill is not None:
+            # Remplissage hors de la transaction de schéma, par petits lots, pour
+            # ne pas bloquer les écritures ; la version n'est enregistrée qu'à la fin
+            migration.backfill(conn)
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                _record_version(conn, migration)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    return current_version(conn)
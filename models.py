@@ -1,56 +1,420 @@
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
+from migrations import apply_migrations
+import applied
+import archive
+import heapq
+import itertools
+import jobs
+import queue
+import rollups
+import threading
+import time
 import uuid
+import versions
 
 DB_PATH = '/app/data/db.sqlite3'
+POOL_SIZE = 5
+# Durée (secondes) pendant laquelle l'existence d'un utilisateur reste en cache
+USER_CACHE_TTL = 30
+
+# Profil de PRAGMA appliqué à chaque nouvelle connexion
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -16000,
+    'mmap_size': 134217728,
+    'temp_store': 'MEMORY',
+}
+
+# Les PRAGMA ne sont pas paramétrables : on n'accepte que des valeurs connues
+_PRAGMA_CHOICES = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY'},
+}
+
+
+def pragma_statements(pragmas):
+    """Construire les instructions PRAGMA en validant chaque valeur"""
+    statements = []
+    for name, value in pragmas.items():
+        if value is None:
+            continue
+        if name in _PRAGMA_CHOICES:
+            value = str(value).upper()
+            if value not in _PRAGMA_CHOICES[name]:
+                raise ValueError(f"Valeur invalide pour PRAGMA {name}: {value}")
+        elif name in ('busy_timeout', 'cache_size', 'mmap_size'):
+            value = int(value)
+        else:
+            raise ValueError(f"PRAGMA non supporté: {name}")
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Curseur qui signale chaque requête (SQL, durée) à l'observateur configuré.
+    La durée couvre l'exécution et la lecture des lignes (fetch*, itération) :
+    SQLite fait l'essentiel d'un parcours pendant la lecture. Elle est signalée
+    une fois le résultat épuisé, à la requête suivante ou à la fermeture du
+    curseur ; sans lignes à lire (écritures), tout de suite.
+    """
+
+    _statement = None
+    _seconds = 0.0
+
+    def _report(self):
+        if self._statement is None:
+            return
+        sql, self._statement = self._statement, None
+        if _query_observer is not None:
+            _query_observer(sql, self._seconds)
+
+    def _execute(self, method, sql, parameters):
+        self._report()
+        if _query_observer is None:
+            return method(sql, parameters)
+        start = time.perf_counter()
+        try:
+            result = method(sql, parameters)
+        except BaseException:
+            _query_observer(sql, time.perf_counter() - start)
+            raise
+        self._statement = sql
+        self._seconds = time.perf_counter() - start
+        if self.description is None:
+            self._report()
+        return result
+
+    def _fetch(self, method, *args):
+        if self._statement is None:
+            return method(*args)
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._seconds += time.perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        return self._execute(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._execute(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if row is None:
+            self._report()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._fetch(super().fetchmany, size)
+        if len(rows) < size:
+            self._report()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        self._report()
+        return rows
+
+    def __next__(self):
+        if self._statement is None:
+            return super().__next__()
+        try:
+            return self._fetch(super().__next__)
+        except StopIteration:
+            self._report()
+            raise
+
+    def close(self):
+        self._report()
+        super().close()
+
+    def __del__(self):
+        # Curseur abandonné avant la fin du résultat (ex: un seul fetchone())
+        self._report()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connexion dont les curseurs (y compris ceux de conn.execute) sont instrumentés"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Les raccourcis de sqlite3.Connection créent leur curseur sans passer par
+    # cursor() : on les redéfinit comme le fait le module
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class PooledConnection:
+    """Connexion empruntée au pool : close() la rend au pool au lieu de la fermer"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        """Rendre la connexion au pool"""
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+
+class ConnectionPool:
+    """Pool borné de connexions SQLite réutilisées d'une requête à l'autre"""
+
+    def __init__(self, db_path, max_size=POOL_SIZE, pragmas=None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._pragmas = pragma_statements(pragmas or {})
+        # LIFO : on réutilise en priorité la connexion la plus récente (cache chaud)
+        self._idle = queue.LifoQueue(maxsize=max_size)
+
+    def _connect(self):
+        # Une connexion peut être rendue par un thread et reprise par un autre.
+        # Les chemins "file:..." sont des URI SQLite (ex: base partagée en
+        # mémoire "file:test?mode=memory&cache=shared" pour les tests)
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            uri=self.db_path.startswith('file:'),
+            factory=InstrumentedConnection
+        )
+        conn.row_factory = sqlite3.Row
+        for statement in self._pragmas:
+            conn.execute(statement)
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """Emprunter une connexion valide (réutilisée ou nouvelle)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return PooledConnection(self, self._connect())
+
+            if self._is_healthy(conn):
+                return PooledConnection(self, conn)
+            conn.close()
+
+    def release(self, conn):
+        """Remettre une connexion dans le pool, ou la fermer si le pool est plein"""
+        try:
+            # Ne jamais rendre une transaction à moitié faite au prochain emprunteur
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (sqlite3.Error, queue.Full):
+            conn.close()
+
+    def close_all(self):
+        """Fermer toutes les connexions inactives"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+
+# Même (user_id, date, time) : on AJOUTE aux quantités existantes, en une
+# seule instruction atomique
+_UPSERT_CONSUMPTION = '''
+    INSERT INTO consumption (user_id, date, time, pints, half_pints, liters_33)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, date, time) DO UPDATE SET
+        pints = COALESCE(pints, 0) + excluded.pints,
+        half_pints = COALESCE(half_pints, 0) + excluded.half_pints,
+        liters_33 = COALESCE(liters_33, 0) + excluded.liters_33
+'''
+
+
+def _write_consumption(conn, entries):
+    """Écrire des consommations et tenir à jour archive, agrégats et versions, dans la transaction de l'appelant"""
+    conn.executemany(_UPSERT_CONSUMPTION, entries)
+    archive.absorb_late_entries(conn, entries)
+    rollups.add(conn, entries)
+    versions.bump_users(conn, (entry[0] for entry in entries))
+    versions.bump_leaderboard(conn)
+
+
+# Colonnes de consumption exposées par get_consumption_page
+CONSUMPTION_FIELDS = ('id', 'date', 'time', 'pints', 'half_pints', 'liters_33')
+
+# Quantité maximale d'une consommation (par colonne). Bien en deçà des entiers
+# 64 bits de SQLite : ni l'insertion ni les SUM des agrégats et classements ne
+# peuvent déborder
+MAX_QUANTITY = 2**31 - 1
+
+
+def _bump_rebuilt(conn, user_ids):
+    """Agrégats recalculés : nouvelles versions (ETag, clés du cache des classements)"""
+    versions.bump_users(conn, user_ids)
+    versions.bump_leaderboard(conn)
+
+
+def _slot_key(row):
+    return row['date'], row['time']
+
+
+def _iter_user_consumption(conn, columns, user_id, start_date=None, end_date=None, before=None, limit=None, offset=0):
+    """
+    Consommations d'un utilisateur, de la plus récente à la plus ancienne :
+    table consumption et archive (archive.py) lues chacune dans l'ordre de
+    son index, limitées à limit + offset lignes, puis fusionnées au fil de
+    l'eau (heapq.merge) : aucun tri SQL, même pour un export complet.
+    date et time sont toujours lus (clé de la fusion).
+    """
+    columns = list(dict.fromkeys([*columns, 'date', 'time']))
+    query = f'''
+        SELECT {', '.join(columns)}
+        FROM consumption
+        WHERE user_id = ?
+    '''
+    params = [user_id]
+    
+    if start_date:
+        query += ' AND date >= ?'
+        params.append(start_date)
+    
+    if end_date:
+        query += ' AND date <= ?'
+        params.append(end_date)
+    
+    if before is not None:
+        query += ' AND (date, time) < (?, ?)'
+        params.extend(before)
+    
+    branch_limit = None if limit is None else limit + offset
+    query += ' ORDER BY date DESC, time DESC LIMIT ?'
+    params.append(-1 if branch_limit is None else branch_limit)
+    
+    archive_query, archive_params = archive.user_rows(user_id, start_date, end_date, before, branch_limit, columns)
+    merged = heapq.merge(
+        conn.execute(query, params), conn.execute(archive_query, archive_params),
+        key=_slot_key, reverse=True
+    )
+    return itertools.islice(merged, offset, branch_limit)
+
+_pool = None
+# Observateurs facultatifs (voir Database.set_observers) : query(sql, secondes)
+# pour chaque requête, connection() pour chaque connexion empruntée
+_query_observer = None
+_connection_observer = None
+# SQLite n'accepte qu'un écrivain à la fois : on sérialise les écritures du
+# processus ici plutôt que de laisser les threads dormir dans le busy handler
+_write_lock = threading.Lock()
+
+# Cache des utilisateurs existants (user_id -> expiration), consulté à chaque
+# requête authentifiée. Seuls les utilisateurs trouvés sont mis en cache ;
+# delete_user les retire aussitôt, les autres processus au plus tard après
+# USER_CACHE_TTL secondes
+_user_cache = {}
+_user_cache_lock = threading.Lock()
+
 
 class Database:
+    @staticmethod
+    def configure(db_path=None, pool_size=None, pragmas=None, user_cache_ttl=None):
+        """Configurer le chemin de la base, le pool de connexions, les PRAGMA et le cache des utilisateurs"""
+        global DB_PATH, POOL_SIZE, USER_CACHE_TTL
+        if db_path is not None:
+            DB_PATH = db_path
+        if pool_size is not None:
+            POOL_SIZE = int(pool_size)
+        if user_cache_ttl is not None:
+            USER_CACHE_TTL = float(user_cache_ttl)
+        if pragmas is not None:
+            # Valider tout de suite plutôt qu'à la première connexion
+            pragma_statements(pragmas)
+            PRAGMAS.update(pragmas)
+        Database.close_pool()
+        with _user_cache_lock:
+            _user_cache.clear()
+
+    @staticmethod
+    def close_pool():
+        """Fermer les connexions du pool (arrêt de l'application, changement de config)"""
+        global _pool
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
     @staticmethod
     def init_db():
-        """Initialiser la base de données"""
-        Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-       # Table utilisateurs avec UUID comme clé primaire
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                is_admin INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                night_mode_until TIMESTAMP DEFAULT NULL
-            )
-
-        ''')
+        """Initialiser la base de données (applique les migrations en attente)"""
+        if not DB_PATH.startswith('file:'):
+            Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
         
-        # Table consommation avec user_id en TEXT pour UUID
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS consumption (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                date DATE NOT NULL,
-                time TIME NOT NULL DEFAULT '00:00:00',
-                pints INTEGER DEFAULT 0,
-                half_pints INTEGER DEFAULT 0,
-                liters_33 INTEGER DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                UNIQUE(user_id, date, time)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        conn = Database.get_connection()
+        try:
+            apply_migrations(conn)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def set_observers(query=None, connection=None):
+        """Brancher (ou retirer avec None) les observateurs de requêtes et de connexions"""
+        global _query_observer, _connection_observer
+        _query_observer = query
+        _connection_observer = connection
 
     @staticmethod
     def get_connection():
-        """Obtenir une connexion à la base de données"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Obtenir une connexion du pool (conn.close() la rend au pool)"""
+        global _pool
+        if _pool is None:
+            _pool = ConnectionPool(DB_PATH, POOL_SIZE, PRAGMAS)
+        if _connection_observer is not None:
+            _connection_observer()
+        return _pool.acquire()
+
+    @staticmethod
+    @contextmanager
+    def transaction():
+        """Transaction d'écriture (BEGIN IMMEDIATE), validée ou annulée en sortie"""
+        with _write_lock:
+            conn = Database.get_connection()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
     
     @staticmethod
     def user_exists(username):
@@ -62,6 +426,44 @@ class Database:
         conn.close()
         return result is not None
     
+    @staticmethod
+    def user_id_exists(user_id):
+        """Vérifier si un utilisateur existe d'après son ID, avec cache (voir USER_CACHE_TTL)"""
+        now = time.monotonic()
+        with _user_cache_lock:
+            expires_at = _user_cache.get(user_id)
+            if expires_at is not None and now < expires_at:
+                return True
+
+        conn = Database.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM users WHERE id = ?', (user_id,))
+        result = cursor.fetchone()
+        conn.close()
+
+        with _user_cache_lock:
+            if result is None:
+                _user_cache.pop(user_id, None)
+                return False
+            # Purge des entrées expirées pour borner la taille du cache
+            for expired in [key for key, value in _user_cache.items() if value <= now]:
+                del _user_cache[expired]
+            _user_cache[user_id] = now + USER_CACHE_TTL
+        return True
+    
+    @staticmethod
+    def get_user_auth(username):
+        """Obtenir id, hash du mot de passe et statut admin d'un utilisateur (ou None)"""
+        conn = Database.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT id, password, is_admin FROM users WHERE username = ?',
+            (username,)
+        )
+        user = cursor.fetchone()
+        conn.close()
+        return user
+    
     @staticmethod
     def get_user_id(username):
         """Obtenir l'ID (UUID) d'un utilisateur"""
@@ -72,6 +474,16 @@ class Database:
         conn.close()
         return result[0] if result else None  # Retourne un UUID string
 
+    @staticmethod
+    def get_user_ids():
+        """Obtenir la correspondance nom d'utilisateur -> ID de tous les utilisateurs"""
+        conn = Database.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT username, id FROM users')
+        user_ids = {row['username']: row['id'] for row in cursor.fetchall()}
+        conn.close()
+        return user_ids
+
     @staticmethod
     def create_user(username, password):
         """Créer un nouvel utilisateur avec UUID aléatoire"""
@@ -79,33 +491,26 @@ class Database:
         if Database.user_exists(username):
             return False, "Un utilisateur avec ce nom existe déjà"
     
-        conn = Database.get_connection()
-        cursor = conn.cursor()
-    
         try:
             # Générer un UUID v4 aléatoire
             user_id = str(uuid.uuid4())
     
-            cursor.execute(
-                'INSERT INTO users (id, username, password) VALUES (?, ?, ?)',
-                (user_id, username, password)
-            )
-            conn.commit()
-            conn.close()
+            with Database.transaction() as conn:
+                conn.execute(
+                    'INSERT INTO users (id, username, password) VALUES (?, ?, ?)',
+                    (user_id, username, password)
+                )
+                versions.bump_leaderboard(conn)
             return True, "Utilisateur créé avec succès"
         except sqlite3.IntegrityError:
-            conn.close()
             return False, "Erreur lors de la création de l'utilisateur"
 
     @staticmethod
     def update_user_password(username, new_password):
         """Mettre à jour le mot de passe d'un utilisateur"""
-        conn = Database.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE users SET password = ? WHERE username = ?', 
-                      (new_password, username))
-        conn.commit()
-        conn.close()
+        with Database.transaction() as conn:
+            conn.execute('UPDATE users SET password = ? WHERE username = ?', 
+                         (new_password, username))
     
     @staticmethod
     def get_all_users():
@@ -120,44 +525,122 @@ class Database:
     @staticmethod
     def add_consumption(user_id, date, pints=0, half_pints=0, liters_33=0, time='00:00:00'):
         """Ajouter une consommation avec heure (AJOUTER, non remplacer)"""
+        entry = (user_id, date, time, pints, half_pints, liters_33)
+        with Database.transaction() as conn:
+            _write_consumption(conn, [entry])
+
+    @staticmethod
+    def add_consumption_batch(entries, job_checkpoint=None):
+        """
+        Ajouter plusieurs consommations en une seule transaction.
+        entries : tuples (user_id, date, time, pints, half_pints, liters_33).
+        job_checkpoint : (id de tâche, lignes) enregistré dans la même
+        transaction (jobs.checkpoint) ; jobs.JobLost si la tâche n'est plus
+        running, rien n'est alors écrit. Retourne le nombre d'entrées écrites.
+        """
+        entries = list(entries)
+        if not entries:
+            return 0
+        with Database.transaction() as conn:
+            if job_checkpoint is not None and not jobs.checkpoint(conn, *job_checkpoint):
+                raise jobs.JobLost(job_checkpoint[0])
+            _write_consumption(conn, entries)
+        return len(entries)
+    
+    @staticmethod
+    def add_client_consumption_batch(user_id, entries):
+        """
+        Ajouter la file d'attente d'un client en une seule transaction.
+        entries : (id client ou None, (date, time, pints, half_pints, liters_33)).
+        Une entrée dont l'id est déjà appliqué (applied) est sautée : rejouer
+        le lot ne compte rien deux fois. Retourne, par entrée, True si écrite.
+        """
+        entries = list(entries)
+        if not entries:
+            return []
+        with Database.transaction() as conn:
+            applied.prune(conn)
+            written = [
+                entry_id is None or applied.claim(conn, user_id, entry_id)
+                for entry_id, _ in entries
+            ]
+            rows = [(user_id, *values) for (_, values), new in zip(entries, written) if new]
+            if rows:
+                _write_consumption(conn, rows)
+        return written
+    
+    @staticmethod
+    def get_consumption(user_id, start_date=None, end_date=None, limit=None, offset=0):
+        """Obtenir la consommation d'un utilisateur, archive comprise (limit/offset pour paginer)"""
+        conn = Database.get_connection()
+        try:
+            return list(_iter_user_consumption(
+                conn, ('id', 'user_id', 'date', 'time', 'pints', 'half_pints', 'liters_33'),
+                user_id, start_date, end_date, limit=limit, offset=offset
+            ))
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def get_consumption_page(user_id, start_date=None, end_date=None, limit=100, before=None, fields=None):
+        """
+        Page de consommations d'un utilisateur, archive comprise, de la plus
+        récente à la plus ancienne. Pagination par curseur : before=(date, time)
+        de la dernière ligne de la page précédente (coût constant, contrairement
+        à OFFSET). fields : colonnes à retourner (parmi CONSUMPTION_FIELDS),
+        toutes par défaut ; id vaut None pour les lignes archivées.
+        """
+        if any(field not in CONSUMPTION_FIELDS for field in fields or ()):
+            raise ValueError(f"Colonnes inconnues : {fields}")
+
+        conn = Database.get_connection()
+        try:
+            return list(_iter_user_consumption(
+                conn, fields or CONSUMPTION_FIELDS, user_id, start_date, end_date, before=before, limit=limit
+            ))
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def get_daily_consumption(user_id, start_date=None, end_date=None):
+        """Obtenir les totaux de consommation d'un utilisateur par jour, depuis l'agrégat journalier"""
         conn = Database.get_connection()
         cursor = conn.cursor()
         
-        # Vérifier si l'entrée existe (même date ET même heure)
-        cursor.execute(
-            'SELECT pints, half_pints, liters_33 FROM consumption WHERE user_id = ? AND date = ? AND time = ?',
-            (user_id, date, time)
-        )
-        existing = cursor.fetchone()
+        query = 'SELECT date, pints, half_pints, liters_33 FROM consumption_daily WHERE user_id = ?'
+        params = [user_id]
         
-        if existing:
-            # AJOUTER aux valeurs existantes
-            new_pints = (existing['pints'] or 0) + pints
-            new_half_pints = (existing['half_pints'] or 0) + half_pints
-            new_liters_33 = (existing['liters_33'] or 0) + liters_33
-            
-            cursor.execute('''
-                UPDATE consumption 
-                SET pints = ?, half_pints = ?, liters_33 = ?
-                WHERE user_id = ? AND date = ? AND time = ?
-            ''', (new_pints, new_half_pints, new_liters_33, user_id, date, time))
-        else:
-            # Créer une nouvelle entrée
-            cursor.execute('''
-                INSERT INTO consumption (user_id, date, time, pints, half_pints, liters_33)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_id, date, time, pints, half_pints, liters_33))
+        if start_date:
+            query += ' AND date >= ?'
+            params.append(start_date)
+        
+        if end_date:
+            query += ' AND date <= ?'
+            params.append(end_date)
+        
+        query += ' ORDER BY date'
         
-        conn.commit()
+        cursor.execute(query, params)
+        days = cursor.fetchall()
         conn.close()
+        
+        return days
     
     @staticmethod
-    def get_consumption(user_id, start_date=None, end_date=None):
-        """Obtenir la consommation d'un utilisateur"""
+    def get_monthly_consumption(user_id, start_date=None, end_date=None):
+        """Obtenir les totaux de consommation d'un utilisateur par mois (YYYY-MM), depuis l'agrégat journalier"""
         conn = Database.get_connection()
         cursor = conn.cursor()
         
-        query = 'SELECT * FROM consumption WHERE user_id = ?'
+        query = '''
+            SELECT
+                substr(date, 1, 7) AS month,
+                SUM(pints) AS pints,
+                SUM(half_pints) AS half_pints,
+                SUM(liters_33) AS liters_33
+            FROM consumption_daily
+            WHERE user_id = ?
+        '''
         params = [user_id]
         
         if start_date:
@@ -168,46 +651,147 @@ class Database:
             query += ' AND date <= ?'
             params.append(end_date)
         
-        query += ' ORDER BY date DESC, time DESC'
+        query += ' GROUP BY month ORDER BY month DESC'
         
         cursor.execute(query, params)
-        records = cursor.fetchall()
+        months = cursor.fetchall()
         conn.close()
         
-        return records
+        return months
     
     @staticmethod
-    def delete_user(user_id):
-        """Supprimer un utilisateur et ses données"""
+    def get_weekly_consumption(user_id, start_date, end_date):
+        """
+        Obtenir les totaux d'un utilisateur par semaine (lundi-dimanche) sur une
+        période, avec les jours de consommation de chaque semaine, en une requête
+        sur l'agrégat journalier
+        """
         conn = Database.get_connection()
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM consumption WHERE user_id = ?', (user_id,))
-        cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
-        conn.commit()
+        cursor.execute('''
+            SELECT
+                date(date, 'weekday 0', '-6 days') AS week_start,
+                SUM(pints) AS pints,
+                SUM(half_pints) AS half_pints,
+                SUM(liters_33) AS liters_33,
+                GROUP_CONCAT(date) AS drinking_days
+            FROM consumption_daily
+            WHERE user_id = ? AND date >= ? AND date <= ?
+            GROUP BY week_start
+            ORDER BY week_start
+        ''', (user_id, start_date, end_date))
+        weeks = cursor.fetchall()
         conn.close()
+        
+        return weeks
+    
+    @staticmethod
+    def rebuild_rollups():
+        """Recalculer les tables d'agrégats depuis consumption"""
+        conn = Database.get_connection()
+        try:
+            return rollups.rebuild(conn, source=archive.UNION_SOURCE, on_batch=_bump_rebuilt)
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def check_rollups():
+        """Lister les écarts entre les tables d'agrégats et consumption"""
+        conn = Database.get_connection()
+        try:
+            return rollups.check(conn, source=archive.UNION_SOURCE)
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def iter_consumption_export(user_id=None, batch_size=1000):
+        """
+        Parcourir les consommations à exporter (archive comprise), lues par
+        lots de batch_size. Sans user_id : tous les utilisateurs non-admin,
+        avec leur nom, en une seule requête. La connexion est rendue au pool
+        à la fin du parcours.
+        """
+        conn = Database.get_connection()
+        try:
+            cursor = conn.cursor()
+            if user_id is None:
+                cursor.execute(f'''
+                    SELECT users.username AS username, consumption.date AS date, consumption.time AS time,
+                           consumption.pints, consumption.half_pints, consumption.liters_33
+                    FROM users
+                    JOIN consumption ON consumption.user_id = users.id
+                    WHERE users.is_admin = 0
+                    UNION ALL
+                    SELECT users.username, {archive.DECODE_DATE}, {archive.DECODE_TIME},
+                           archive_consumption.pints, archive_consumption.half_pints,
+                           archive_consumption.liters_33
+                    FROM users
+                    JOIN archive_users ON archive_users.user_id = users.id
+                    JOIN archive_consumption ON archive_consumption.user_key = archive_users.key
+                    WHERE users.is_admin = 0
+                    ORDER BY username, date DESC, time DESC
+                ''')
+            else:
+                yield from _iter_user_consumption(conn, ('date', 'time', 'pints', 'half_pints', 'liters_33'), user_id)
+                return
+
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def delete_user(user_id):
+        """Supprimer un utilisateur et ses données"""
+        with Database.transaction() as conn:
+            conn.execute('DELETE FROM consumption WHERE user_id = ?', (user_id,))
+            archive.delete_user(conn, user_id)
+            rollups.delete_user(conn, user_id)
+            conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+            versions.bump_leaderboard(conn)
+        with _user_cache_lock:
+            _user_cache.pop(user_id, None)
 
     @staticmethod
     def set_night_mode(user_id, enabled):
         """Active/Désactive le mode soirée"""
+        with Database.transaction() as conn:
+            if enabled:
+                # Mode soirée activé jusqu'à demain 7h
+                tomorrow_7am = datetime.now().replace(hour=7, minute=0, second=0, microsecond=0) + timedelta(days=1)
+                conn.execute(
+                    'UPDATE users SET night_mode_until = ? WHERE id = ?',
+                    (tomorrow_7am.isoformat(), user_id)
+                )
+            else:
+                # Désactiver le mode soirée
+                conn.execute(
+                    'UPDATE users SET night_mode_until = NULL WHERE id = ?',
+                    (user_id,)
+                )
+            versions.bump_users(conn, [user_id])
+
+    @staticmethod
+    def get_user_data_state(user_id):
+        """Version des données et fin du mode soirée d'un utilisateur, en une lecture (ou None)"""
         conn = Database.get_connection()
         cursor = conn.cursor()
-    
-        if enabled:
-            # Mode soirée activé jusqu'à demain 7h
-            tomorrow_7am = datetime.now().replace(hour=7, minute=0, second=0, microsecond=0) + timedelta(days=1)
-            cursor.execute(
-                'UPDATE users SET night_mode_until = ? WHERE id = ?',
-                (tomorrow_7am.isoformat(), user_id)
-            )
-        else:
-            # Désactiver le mode soirée
-            cursor.execute(
-                'UPDATE users SET night_mode_until = NULL WHERE id = ?',
-                (user_id,)
-            )
-    
-        conn.commit()
+        cursor.execute('SELECT data_version, night_mode_until FROM users WHERE id = ?', (user_id,))
+        result = cursor.fetchone()
         conn.close()
+        return result
+
+    @staticmethod
+    def get_leaderboard_version():
+        """Version des données des classements"""
+        conn = Database.get_connection()
+        try:
+            return versions.leaderboard_version(conn)
+        finally:
+            conn.close()
 
     @staticmethod
     def get_night_mode_status(user_id):
@@ -230,6 +814,89 @@ class Database:
     
         return True
 
+    @staticmethod
+    def create_job(kind, created_by=None, input_path=None, total=None):
+        """Mettre une tâche de fond en attente ; retourne son identifiant"""
+        with Database.transaction() as conn:
+            return jobs.create(conn, kind, created_by, input_path, total)
 
-    
-    
+    @staticmethod
+    def has_pending_jobs(stale_seconds):
+        """Une tâche à réclamer ou à déclarer perdue ? (lecture seule)"""
+        conn = Database.get_connection()
+        try:
+            return jobs.has_pending(conn, stale_seconds)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def claim_job(stale_seconds):
+        """
+        Réclamer la prochaine tâche en attente (ou None), après avoir marqué
+        en échec les tâches abandonnées par un processus disparu
+        """
+        with Database.transaction() as conn:
+            jobs.fail_stale(conn, stale_seconds)
+            return jobs.claim(conn)
+
+    @staticmethod
+    def report_job_progress(job_id, progress, total=None):
+        with Database.transaction() as conn:
+            return jobs.report_progress(conn, job_id, progress, total)
+
+    @staticmethod
+    def finish_job(job_id, result=None, result_path=None, progress=None):
+        with Database.transaction() as conn:
+            return jobs.finish(conn, job_id, result, result_path, progress)
+
+    @staticmethod
+    def fail_job(job_id, error):
+        with Database.transaction() as conn:
+            return jobs.fail(conn, job_id, error)
+
+    @staticmethod
+    def resume_job(job_id):
+        with Database.transaction() as conn:
+            return jobs.resume(conn, job_id)
+
+    @staticmethod
+    def get_job(job_id):
+        conn = Database.get_connection()
+        try:
+            return jobs.get(conn, job_id)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_recent_jobs(limit=10):
+        conn = Database.get_connection()
+        try:
+            return jobs.recent(conn, limit)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def delete_expired_jobs(retention_days):
+        """Purger les tâches terminées anciennes ; retourne les fichiers à effacer"""
+        with Database.transaction() as conn:
+            return jobs.delete_expired(conn, retention_days)
+
+    @staticmethod
+    def archive_years(before_year):
+        """
+        Archiver (archive.py) toutes les années antérieures à before_year
+        encore présentes dans consumption. Retourne {année: lignes archivées}.
+        """
+        conn = Database.get_connection()
+        try:
+            return {year: archive.archive_year(conn, year) for year in archive.pending_years(conn, before_year)}
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_archived_years():
+        conn = Database.get_connection()
+        try:
+            return archive.archived_years(conn)
+        finally:
+            conn.close()
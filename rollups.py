@@ -0,0 +1,177 @@
+from collections import defaultdict
+
+# Tables d'agrégats (par utilisateur et par jour / par mois) tenues à jour à
+# chaque écriture dans consumption : classements et statistiques les lisent
+# au lieu de parcourir toutes les consommations
+
+# Nombre d'utilisateurs recalculés par transaction lors d'une reconstruction
+REBUILD_BATCH_SIZE = 50
+
+_ADD_DAILY = '''
+    INSERT INTO consumption_daily (user_id, date, pints, half_pints, liters_33)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, date) DO UPDATE SET
+        pints = pints + excluded.pints,
+        half_pints = half_pints + excluded.half_pints,
+        liters_33 = liters_33 + excluded.liters_33
+'''
+
+_ADD_MONTHLY = '''
+    INSERT INTO consumption_monthly (user_id, month, pints, half_pints, liters_33)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, month) DO UPDATE SET
+        pints = pints + excluded.pints,
+        half_pints = half_pints + excluded.half_pints,
+        liters_33 = liters_33 + excluded.liters_33
+'''
+
+# Consommations d'origine : la table consumption, ou archive.UNION_SOURCE une
+# fois des années archivées (table ou sous-requête de mêmes colonnes)
+CONSUMPTION_SOURCE = 'consumption'
+
+_DAILY_FROM_SOURCE = '''
+    SELECT user_id, date,
+           COALESCE(SUM(pints), 0), COALESCE(SUM(half_pints), 0), COALESCE(SUM(liters_33), 0)
+    FROM {source}
+'''
+
+_MONTHLY_FROM_DAILY = '''
+    SELECT user_id, substr(date, 1, 7),
+           SUM(pints), SUM(half_pints), SUM(liters_33)
+    FROM consumption_daily
+'''
+
+
+def create_tables(conn):
+    """Créer les tables d'agrégats"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS consumption_daily (
+            user_id TEXT NOT NULL,
+            date DATE NOT NULL,
+            pints INTEGER NOT NULL DEFAULT 0,
+            half_pints INTEGER NOT NULL DEFAULT 0,
+            liters_33 INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, date)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS consumption_monthly (
+            user_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            pints INTEGER NOT NULL DEFAULT 0,
+            half_pints INTEGER NOT NULL DEFAULT 0,
+            liters_33 INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month)
+        ) WITHOUT ROWID
+    ''')
+    # Classements : parcours d'une période pour tous les utilisateurs
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_consumption_monthly_month
+        ON consumption_monthly (month, user_id, pints, half_pints, liters_33)
+    ''')
+
+
+def add(conn, entries):
+    """
+    Reporter des consommations dans les agrégats, dans la transaction de l'appelant.
+    entries : tuples (user_id, date, time, pints, half_pints, liters_33).
+    """
+    daily = defaultdict(lambda: [0, 0, 0])
+    for user_id, date, _, pints, half_pints, liters_33 in entries:
+        totals = daily[(user_id, date)]
+        totals[0] += pints or 0
+        totals[1] += half_pints or 0
+        totals[2] += liters_33 or 0
+
+    monthly = defaultdict(lambda: [0, 0, 0])
+    for (user_id, date), totals in daily.items():
+        month_totals = monthly[(user_id, date[:7])]
+        for i, value in enumerate(totals):
+            month_totals[i] += value
+
+    conn.executemany(_ADD_DAILY, [(*key, *totals) for key, totals in daily.items()])
+    conn.executemany(_ADD_MONTHLY, [(*key, *totals) for key, totals in monthly.items()])
+
+
+def delete_user(conn, user_id):
+    """Supprimer les agrégats d'un utilisateur, dans la transaction de l'appelant"""
+    conn.execute('DELETE FROM consumption_daily WHERE user_id = ?', (user_id,))
+    conn.execute('DELETE FROM consumption_monthly WHERE user_id = ?', (user_id,))
+
+
+def rebuild(conn, batch_size=REBUILD_BATCH_SIZE, source=CONSUMPTION_SOURCE, on_batch=None):
+    """
+    Recalculer les agrégats depuis source, par lots d'utilisateurs (une
+    transaction par lot, les écritures concurrentes restent possibles).
+    on_batch(conn, user_ids), facultatif, est appelé dans la transaction de
+    chaque lot. Retourne le nombre d'utilisateurs recalculés.
+    """
+    user_ids = [row[0] for row in conn.execute(f'''
+        SELECT DISTINCT user_id FROM {source}
+        UNION
+        SELECT user_id FROM consumption_daily
+        UNION
+        SELECT user_id FROM consumption_monthly
+    ''')]
+
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        placeholders = ', '.join('?' * len(batch))
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(f'DELETE FROM consumption_daily WHERE user_id IN ({placeholders})', batch)
+            conn.execute(f'DELETE FROM consumption_monthly WHERE user_id IN ({placeholders})', batch)
+            conn.execute(f'''
+                INSERT INTO consumption_daily (user_id, date, pints, half_pints, liters_33)
+                {_DAILY_FROM_SOURCE.format(source=source)}
+                WHERE user_id IN ({placeholders})
+                GROUP BY user_id, date
+            ''', batch)
+            conn.execute(f'''
+                INSERT INTO consumption_monthly (user_id, month, pints, half_pints, liters_33)
+                {_MONTHLY_FROM_DAILY}
+                WHERE user_id IN ({placeholders})
+                GROUP BY user_id, substr(date, 1, 7)
+            ''', batch)
+            if on_batch is not None:
+                on_batch(conn, batch)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    return len(user_ids)
+
+
+def _differences(conn, expected, actual):
+    return conn.execute(f'''
+        SELECT * FROM ({expected} EXCEPT {actual})
+        UNION
+        SELECT * FROM ({actual} EXCEPT {expected})
+    ''').fetchall()
+
+
+def check(conn, source=CONSUMPTION_SOURCE):
+    """
+    Comparer les agrégats avec un recalcul complet depuis source.
+    Retourne les écarts : tuples (table, user_id, jour ou mois).
+    """
+    mismatches = set()
+
+    expected_daily = f'{_DAILY_FROM_SOURCE.format(source=source)} GROUP BY user_id, date'
+    actual_daily = 'SELECT user_id, date, pints, half_pints, liters_33 FROM consumption_daily'
+    for row in _differences(conn, expected_daily, actual_daily):
+        mismatches.add(('consumption_daily', row[0], row[1]))
+
+    expected_monthly = f'''
+        SELECT user_id, substr(date, 1, 7),
+               COALESCE(SUM(pints), 0), COALESCE(SUM(half_pints), 0), COALESCE(SUM(liters_33), 0)
+        FROM {source}
+        GROUP BY user_id, substr(date, 1, 7)
+    '''
+    actual_monthly = 'SELECT user_id, month, pints, half_pints, liters_33 FROM consumption_monthly'
+    for row in _differences(conn, expected_monthly, actual_monthly):
+        mismatches.add(('consumption_monthly', row[0], row[1]))
+
+    return sorted(mismatches)
@@ -23,11 +23,24 @@ let currentBeer = {
 
 let monthlyChart = null;
 let totalChart = null;
-let savingInProgress = false;
 let nightModeEnabled = false;
 let lastClickTime = 0;
 let weeklyChart = null;
 
+// File d'attente des consommations : envoyées par lots, conservées (par
+// utilisateur) dans le navigateur tant que le serveur ne les a pas reçues
+const QUEUE_STORAGE_KEY = `beertracker_pending_entries:${document.body.dataset.username || ''}`;
+const QUEUE_FLUSH_DELAY = 1000;
+const QUEUE_RETRY_DELAY = 15000;
+const QUEUE_BATCH_SIZE = 100;
+// Un seul onglet envoie la file à la fois (Web Locks) ; chaque entrée porte un
+// id que le serveur n'applique qu'une fois, même rejouée
+const QUEUE_LOCK_NAME = `beertracker_queue:${document.body.dataset.username || ''}`;
+let pendingEntries = loadPendingEntries();
+let flushTimer = null;
+let flushInProgress = false;
+let offlineNotified = false;
+
 document.addEventListener('DOMContentLoaded', function() {
     const today = new Date().toISOString().split('T')[0];
     
@@ -58,6 +71,14 @@ document.addEventListener('DOMContentLoaded', function() {
     
     loadTodayConsumption();
     loadNightModeStatus();
+    flushQueue();
+    window.addEventListener('online', flushQueue);
+    window.addEventListener('storage', function(event) {
+        if (event.key !== QUEUE_STORAGE_KEY) return;
+        // File modifiée par un autre onglet
+        pendingEntries = loadPendingEntries();
+        loadTodayConsumption();
+    });
 
     document.addEventListener('languageChanged', function() {
         updateNightModeUI();
@@ -248,24 +269,24 @@ function loadTodayConsumption() {
     
     console.log('Chargement de la consommation pour:', selectedDate);
     
-    fetch(`/api/consumption?start_date=${selectedDate}&end_date=${selectedDate}`)
+    fetch(`/api/consumption?start_date=${selectedDate}&end_date=${selectedDate}&view=summary`)
         .then(response => response.json())
         .then(data => {
+            // Totaux du jour entier (tous les créneaux), calculés côté serveur
             currentBeer = {
-                pints: 0,
-                half_pints: 0,
-                liters_33: 0
+                pints: data.total_pints || 0,
+                half_pints: data.total_half_pints || 0,
+                liters_33: data.total_33cl || 0
             };
-            
-            // Agréger TOUS les enregistrements du jour (tous les créneaux)
-            if (data.records && data.records.length > 0) {
-                data.records.forEach(record => {
-                    currentBeer.pints += record.pints || 0;
-                    currentBeer.half_pints += record.half_pints || 0;
-                    currentBeer.liters_33 += record.liters_33 || 0;
+            // Ajouter les consommations du jour pas encore envoyées
+            pendingEntries
+                .filter(entry => entry.date === selectedDate)
+                .forEach(entry => {
+                    currentBeer.pints += entry.pints;
+                    currentBeer.half_pints += entry.half_pints;
+                    currentBeer.liters_33 += entry.liters_33;
                 });
-                console.log('Consommation totale du jour:', currentBeer);
-            }
+            console.log('Consommation totale du jour:', currentBeer);
             
             document.getElementById('pints-count').innerText = currentBeer.pints;
             document.getElementById('half_pints-count').innerText = currentBeer.half_pints;
@@ -276,47 +297,212 @@ function loadTodayConsumption() {
         });
 }
 
-// Enregistrer automatiquement avec heure actuelle
+// Enregistrer automatiquement avec heure actuelle (via la file d'attente)
 function saveBeerAutomatic(type, value) {
-    if (savingInProgress) return;
-    
-    savingInProgress = true;
-    
     const date = document.getElementById('today-date').value;
     const now = new Date();
     const time = now.toTimeString().slice(0, 8); // HH:MM:SS
     
-    const payload = {
+    queueEntry({
         date: date,
         time: time,
         pints: type === 'pints' ? value : 0,
         half_pints: type === 'half_pints' ? value : 0,
         liters_33: type === 'liters_33' ? value : 0
-    };
+    });
+}
+
+function loadPendingEntries() {
+    try {
+        return JSON.parse(localStorage.getItem(QUEUE_STORAGE_KEY)) || [];
+    } catch (error) {
+        return [];
+    }
+}
+
+function storePendingEntries() {
+    localStorage.setItem(QUEUE_STORAGE_KEY, JSON.stringify(pendingEntries));
+}
+
+function newEntryId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    // randomUUID n'existe qu'en contexte sécurisé (HTTPS)
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    bytes[6] = (bytes[6] & 0x0f) | 0x40;
+    bytes[8] = (bytes[8] & 0x3f) | 0x80;
+    const hex = Array.from(bytes, byte => byte.toString(16).padStart(2, '0')).join('');
+    return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+function queueEntry(entry) {
+    entry.id = newEntryId();
+    // Relire la file : un autre onglet a pu la modifier
+    pendingEntries = loadPendingEntries();
+    pendingEntries.push(entry);
+    storePendingEntries();
+    // Court délai : les clics rapprochés partent dans le même lot
+    scheduleFlush(QUEUE_FLUSH_DELAY);
+}
+
+function scheduleFlush(delay) {
+    if (flushTimer) return;
+    flushTimer = setTimeout(() => {
+        flushTimer = null;
+        flushQueue();
+    }, delay);
+}
+
+function entryType(entry) {
+    return ['pints', 'half_pints', 'liters_33'].find(type => entry[type] !== 0);
+}
+
+function withQueueLock(callback) {
+    if (navigator.locks) {
+        return navigator.locks.request(QUEUE_LOCK_NAME, callback);
+    }
+    // Sans Web Locks, deux onglets peuvent envoyer le même lot : les ids évitent les doublons
+    return callback();
+}
+
+function flushQueue() {
+    if (flushInProgress) return;
+    flushInProgress = true;
+    
+    withQueueLock(sendQueuedBatch)
+        .then(remaining => {
+            flushInProgress = false;
+            offlineNotified = false;
+            if (remaining === null) return;
+            if (remaining > 0) {
+                flushQueue();
+            } else {
+                loadTodayConsumption();
+                loadStats();
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            flushInProgress = false;
+            if (!offlineNotified) {
+                offlineNotified = true;
+                alert(t('save_queued_offline'));
+            }
+            scheduleFlush(QUEUE_RETRY_DELAY);
+        });
+}
+
+// Envoyer un lot de la file ; résout le nombre d'entrées restantes (null : file vide)
+function sendQueuedBatch() {
+    // Relue sous le verrou : un autre onglet a pu en envoyer une partie
+    pendingEntries = loadPendingEntries();
+    if (pendingEntries.length === 0) return Promise.resolve(null);
+    // Entrées gardées par une version précédente, sans id
+    if (pendingEntries.some(entry => !entry.id)) {
+        pendingEntries.forEach(entry => { entry.id = entry.id || newEntryId(); });
+        storePendingEntries();
+    }
+    
+    const batch = pendingEntries.slice(0, QUEUE_BATCH_SIZE);
     
-    fetch('/api/consumption', {
+    return fetch('/api/consumption/batch', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
             'X-CSRFToken': csrfToken
         },
-        body: JSON.stringify(payload)
+        body: JSON.stringify({ entries: batch })
     })
-    .then(response => response.json())
-    .then(data => {
-        showSaveNotification(type, value);
-        loadStats();
-        savingInProgress = false;
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        return response.json();
     })
-    .catch(error => {
-        console.error('Error:', error);
-        savingInProgress = false;
-        currentBeer[type] = Math.max(0, currentBeer[type] - value);
-        document.getElementById(`${type}-count`).innerText = currentBeer[type];
-        alert(t('error_save_connection'));
+    .then(data => {
+        // Entrées écrites, déjà appliquées ou refusées définitivement : retirées
+        // de la file, relue car un onglet a pu y ajouter des entrées entre-temps
+        const sent = new Set(batch.map(entry => entry.id));
+        pendingEntries = loadPendingEntries().filter(entry => !sent.has(entry.id));
+        storePendingEntries();
+        
+        const rejected = data.results.filter(result => !result.ok);
+        rejected.forEach(result => console.error('Entry rejected:', batch[result.index], result.error));
+        if (rejected.length > 0) {
+            showRejectedNotification(rejected.map(result => ({ entry: batch[result.index], error: result.error })));
+        }
+        
+        const saved = data.results
+            .filter(result => result.ok && !result.duplicate)
+            .map(result => batch[result.index]);
+        if (saved.length === 1) {
+            const type = entryType(saved[0]);
+            showSaveNotification(type, saved[0][type]);
+        } else if (saved.length > 1) {
+            showQueueFlushedNotification(saved.length);
+        }
+        
+        return pendingEntries.length;
     });
 }
 
+function showRejectedNotification(rejected) {
+    const notificationDiv = document.createElement('div');
+    notificationDiv.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        max-width: 360px;
+        background-color: #e74c3c;
+        color: white;
+        padding: 12px 20px;
+        border-radius: 4px;
+        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
+        z-index: 10000;
+        font-weight: bold;
+        white-space: pre-line;
+        animation: slideIn 0.3s ease-out;
+    `;
+    const details = rejected
+        .map(({ entry, error }) => `${entry.date} ${entry.time} : ${error}`)
+        .join('\n');
+    notificationDiv.innerText = `❌ ${t('queue_rejected', { count: rejected.length })}\n${details}`;
+    
+    document.body.appendChild(notificationDiv);
+    
+    // Plus longtemps que les confirmations : ces consommations sont perdues
+    setTimeout(() => {
+        notificationDiv.style.animation = 'slideOut 0.3s ease-out';
+        setTimeout(() => notificationDiv.remove(), 300);
+    }, 10000);
+}
+
+function showQueueFlushedNotification(count) {
+    const notificationDiv = document.createElement('div');
+    notificationDiv.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        background-color: #27ae60;
+        color: white;
+        padding: 12px 20px;
+        border-radius: 4px;
+        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
+        z-index: 9999;
+        font-weight: bold;
+        animation: slideIn 0.3s ease-out;
+    `;
+    notificationDiv.innerText = `✅ ${t('queue_flushed', { count })}`;
+    
+    document.body.appendChild(notificationDiv);
+    
+    setTimeout(() => {
+        notificationDiv.style.animation = 'slideOut 0.3s ease-out';
+        setTimeout(() => notificationDiv.remove(), 300);
+    }, 2000);
+}
+
 function showSaveNotification(type, value) {
     const beerLabels = {
         'pints': t('pints'),
@@ -380,7 +566,7 @@ function loadStats() {
     const startDate = document.getElementById('start-date')?.value || '';
     const endDate = document.getElementById('end-date')?.value || '';
     
-    const url = `/api/consumption?start_date=${startDate}&end_date=${endDate}`;
+    const url = `/api/consumption?start_date=${startDate}&end_date=${endDate}&view=summary`;
     
     fetch(url)
         .then(response => response.json())
@@ -488,7 +674,7 @@ function updateCharts(data) {
         return;
     }
     updateMonthlyChart(data.monthly_stats);
-    updateTotalChart(data.records);
+    updateTotalChart(data.daily_stats);
     updateWeeklyChart(data.weekly_stats); 
 }
 
@@ -558,22 +744,17 @@ function updateMonthlyChart(monthlyStats) {
     });
 }
 
-function updateTotalChart(records) {
+function updateTotalChart(dailyStats) {
     const ctx = document.getElementById('totalChart');
     if (!ctx) {
         console.warn('Element totalChart not found');
         return;
     }
 
-    // Agréger les litres par jour (un point = un jour)
+    // Litres par jour (un point = un jour), totaux journaliers fournis par le serveur
     const dailyLitersMap = {};
-    records.forEach(r => {
-        const key = r.date;
-        const liters = (r.pints * 0.5) + (r.half_pints * 0.25) + (r.liters_33 * 0.33);
-        if (!dailyLitersMap[key]) {
-            dailyLitersMap[key] = 0;
-        }
-        dailyLitersMap[key] += liters;
+    dailyStats.forEach(day => {
+        dailyLitersMap[day.date] = (day.pints * 0.5) + (day.half_pints * 0.25) + (day.liters_33 * 0.33);
     });
 
     const dates = Object.keys(dailyLitersMap).sort((a, b) => new Date(a) - new Date(b));
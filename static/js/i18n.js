@@ -31,6 +31,9 @@
             medal_gold: "Or",
             medal_silver: "Argent",
             medal_bronze: "Bronze",
+            ranking_my_rank: "Votre rang : {rank} ({liters} L)",
+            previous_page: "Page précédente",
+            next_page: "Page suivante",
             rank: "Rang",
             user: "Utilisateur",
             liters_total: "Total en L",
@@ -64,6 +67,18 @@
             expected_format_label: "Format attendu:",
             expected_format_value: "Utilisateur | Date | Pintes | Demis | 33cl",
             missing_users_created: "Les utilisateurs manquants seront créés automatiquement.",
+            export_in_background: "Lancer l'export complet",
+            jobs_title: "Tâches en arrière-plan",
+            job_kind_import: "Import",
+            job_kind_export: "Export",
+            job_status_queued: "En attente",
+            job_status_running: "En cours",
+            job_status_done: "Terminée",
+            job_status_failed: "Échec",
+            job_download: "Télécharger",
+            job_resume: "Reprendre",
+            job_progress: "{progress} / {total} lignes",
+            job_progress_rows: "{progress} lignes",
             login_username: "Pseudo",
             login_password: "Mot de passe",
             login_button: "Connexion",
@@ -85,6 +100,9 @@
             night_mode_notification: "🌙 Mode Soirée activé ! Jusqu'à demain 7h.",
             night_mode_block_decrement: "⚠️ Mode Soirée actif : impossible de retirer une bière 😏",
             error_save_connection: "Erreur lors de l'enregistrement. Vérifiez votre connexion.",
+            save_queued_offline: "Serveur injoignable : vos consommations sont gardées et seront envoyées dès que possible.",
+            queue_flushed: "{count} consommations enregistrées",
+            queue_rejected: "{count} consommation(s) refusée(s) par le serveur, non enregistrée(s) :",
             alert_three_hour_title: "⚠️ Plus de 1.5L bu depuis {time}",
             alert_total: "Total",
             chart_cumulative_label: "Total cumulé (L)",
@@ -133,6 +151,9 @@
             medal_gold: "Gold",
             medal_silver: "Silver",
             medal_bronze: "Bronze",
+            ranking_my_rank: "Your rank: {rank} ({liters} L)",
+            previous_page: "Previous page",
+            next_page: "Next page",
             rank: "Rank",
             user: "User",
             liters_total: "Total in L",
@@ -166,6 +187,18 @@
             expected_format_label: "Expected format:",
             expected_format_value: "User | Date | Pints | Half-pints | 33cl",
             missing_users_created: "Missing users will be created automatically.",
+            export_in_background: "Start full export",
+            jobs_title: "Background jobs",
+            job_kind_import: "Import",
+            job_kind_export: "Export",
+            job_status_queued: "Queued",
+            job_status_running: "Running",
+            job_status_done: "Done",
+            job_status_failed: "Failed",
+            job_download: "Download",
+            job_resume: "Resume",
+            job_progress: "{progress} / {total} rows",
+            job_progress_rows: "{progress} rows",
             login_username: "Username",
             login_password: "Password",
             login_button: "Login",
@@ -187,6 +220,9 @@
             night_mode_notification: "🌙 Night mode enabled! Until tomorrow at 7am.",
             night_mode_block_decrement: "⚠️ Night mode is active: you cannot remove a beer 😏",
             error_save_connection: "Error while saving. Please check your connection.",
+            save_queued_offline: "Server unreachable: your drinks are kept and will be sent as soon as possible.",
+            queue_flushed: "{count} drinks saved",
+            queue_rejected: "{count} drink(s) rejected by the server, not saved:",
             alert_three_hour_title: "⚠️ More than 1.5L consumed since {time}",
             alert_total: "Total",
             chart_cumulative_label: "Cumulative total (L)",
@@ -257,6 +293,13 @@
             element.textContent = t(key, { year });
         });
 
+        document.querySelectorAll("[data-i18n-with-rank]").forEach((element) => {
+            const key = element.getAttribute("data-i18n-with-rank");
+            const rank = element.getAttribute("data-rank");
+            const liters = element.getAttribute("data-liters");
+            element.textContent = t(key, { rank, liters });
+        });
+
         document.querySelectorAll("[data-i18n-with-month-year]").forEach((element) => {
             const key = element.getAttribute("data-i18n-with-month-year");
             const year = element.getAttribute("data-year");
@@ -0,0 +1,52 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Variables obligatoires de config.py, avant tout import de l'application
+os.environ.setdefault('SECRET_KEY', 'tests')
+os.environ.setdefault('APP_PORT', '0')
+os.environ.setdefault('ADMIN_PASSWORD', 'tests-admin')
+
+from models import Database
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Base SQLite vierge, migrations appliquées, propre au test"""
+    path = str(tmp_path / 'db.sqlite3')
+    Database.configure(db_path=path)
+    Database.init_db()
+    yield path
+    Database.close_pool()
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    """Configuration de test sur une base vierge (bcrypt au coût minimal, sans CSRF)"""
+    pytest.importorskip('flask')
+    from config import Config
+
+    class TestConfig(Config):
+        DATABASE_PATH = str(tmp_path / 'app.sqlite3')
+        JOBS_DIR = str(tmp_path / 'jobs')
+        JOB_WORKERS = 0
+        BCRYPT_LOG_ROUNDS = 4
+        WTF_CSRF_ENABLED = False
+
+    return TestConfig
+
+@pytest.fixture
+def app(app_config):
+    """Application configurée sur une base vierge, migrations appliquées"""
+    from app import create_app, initialize_database
+
+    app = create_app(app_config)
+    with app.app_context():
+        initialize_database()
+    yield app
+    Database.close_pool()
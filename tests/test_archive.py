@@ -0,0 +1,69 @@
+from auth import hash_password
+from models import Database
+
+
+def _slots(rows):
+    return [(row['date'], row['time'], row['pints'], row['half_pints']) for row in rows]
+
+
+def _row_counts():
+    conn = Database.get_connection()
+    try:
+        return (
+            conn.execute('SELECT COUNT(*) FROM consumption').fetchone()[0],
+            conn.execute('SELECT COUNT(*) FROM archive_consumption').fetchone()[0],
+        )
+    finally:
+        conn.close()
+
+
+def test_late_entries_join_the_archive(db_path):
+    Database.create_user('alice', 'x')
+    user_id = Database.get_user_id('alice')
+    for day in range(1, 6):
+        Database.add_consumption(user_id, f'2022-03-{day:02d}', pints=1, time='20:00:00')
+    Database.add_consumption(user_id, '2024-01-01', pints=1, time='20:00:00')
+    assert Database.archive_years(2023) == {2022: 5}
+
+    # Même créneau qu'une ligne archivée, nouveau créneau, et doublon dans un lot
+    Database.add_consumption(user_id, '2022-03-03', half_pints=1, time='20:00:00')
+    Database.add_consumption_batch([
+        (user_id, '2022-03-04', '21:00:00', 1, 0, 0),
+        (user_id, '2022-03-04', '21:00:00', 1, 0, 0),
+    ])
+
+    assert _row_counts() == (1, 6)
+    records = Database.get_consumption(user_id)
+    assert _slots(records) == [
+        ('2024-01-01', '20:00:00', 1, 0),
+        ('2022-03-05', '20:00:00', 1, 0),
+        ('2022-03-04', '21:00:00', 2, 0),
+        ('2022-03-04', '20:00:00', 1, 0),
+        ('2022-03-03', '20:00:00', 1, 1),
+        ('2022-03-02', '20:00:00', 1, 0),
+        ('2022-03-01', '20:00:00', 1, 0),
+    ]
+
+    # Pagination par curseur : chaque ligne exactement une fois
+    pages, before = [], None
+    while True:
+        page = Database.get_consumption_page(user_id, limit=2, before=before)
+        pages.extend(page)
+        if len(page) < 2:
+            break
+        before = (page[-1]['date'], page[-1]['time'])
+    assert _slots(pages) == _slots(records)
+    assert Database.check_rollups() == []
+
+
+def test_invalid_date_parameters_are_rejected(app):
+    with app.app_context():
+        Database.create_user('alice', hash_password('secret'))
+    client = app.test_client()
+    client.post('/login', data={'username': 'alice', 'password': 'secret'})
+
+    for name in ('start_date', 'end_date'):
+        response = client.get(f'/api/consumption?{name}=2024-13-45')
+        assert response.status_code == 400
+        assert response.get_json() == {'error': f"{name} must be YYYY-MM-DD"}
+    assert client.get('/api/consumption?start_date=2024-01-01&end_date=2024-12-31').status_code == 200
@@ -0,0 +1,16 @@
+import auth
+
+
+def test_dummy_hash_is_ready_before_the_first_login(app):
+    """Utilisateur inconnu : une seule vérification bcrypt, au coût configuré"""
+    assert auth._dummy_hash is not None
+    assert auth._dummy_hash.startswith(f"$2b${app.config['BCRYPT_LOG_ROUNDS']:02d}$")
+
+    operations = []
+    auth.set_hashing_observer(lambda operation, seconds: operations.append(operation))
+    try:
+        response = app.test_client().post('/login', data={'username': 'nobody', 'password': 'secret'})
+    finally:
+        auth.set_hashing_observer(None)
+    assert response.status_code == 200
+    assert operations == ['verify']
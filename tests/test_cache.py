@@ -0,0 +1,22 @@
+import os
+import stat
+import threading
+import time
+
+from cache import SocketBackend, serve
+
+
+def test_cache_socket_is_private(tmp_path):
+    path = str(tmp_path / 'run' / 'cache.sock')
+    threading.Thread(target=serve, args=(path,), daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.01)
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+
+    backend = SocketBackend(path)
+    backend.set('year:2024', [1, 2], 60)
+    assert backend.get('year:2024') == [1, 2]
@@ -0,0 +1,66 @@
+from auth import hash_password
+from models import Database
+
+
+def _login(app, username='alice'):
+    with app.app_context():
+        Database.create_user(username, hash_password('secret'))
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': 'secret'})
+    return client
+
+
+def test_out_of_range_quantity_is_an_entry_error(app):
+    client = _login(app)
+
+    response = client.post('/api/consumption/batch', json=[
+        {'date': '2024-06-01', 'time': '20:00:00', 'pints': 10**20},
+        {'date': '2024-06-01', 'time': '20:30:00', 'pints': -10**20},
+        {'date': '2024-06-01', 'time': '21:00:00', 'half_pints': 1},
+    ])
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['written'] == 1
+    assert [result['ok'] for result in body['results']] == [False, False, True]
+    assert 'pints must be between' in body['results'][0]['error']
+
+
+def test_decrement_is_accepted(app):
+    client = _login(app)
+
+    response = client.post('/api/consumption/batch', json=[
+        {'date': '2024-06-01', 'time': '20:00:00', 'pints': 2},
+        {'date': '2024-06-01', 'time': '20:00:00', 'pints': -1},
+    ])
+
+    assert [result['ok'] for result in response.get_json()['results']] == [True, True]
+    with app.app_context():
+        records = Database.get_consumption(Database.get_user_id('alice'))
+        assert [(r['time'], r['pints']) for r in records] == [('20:00:00', 1)]
+        assert Database.check_rollups() == []
+
+
+def test_replayed_entry_ids_are_applied_once(app):
+    client = _login(app)
+    batch = [
+        {'id': 'entry-1', 'date': '2024-06-01', 'time': '20:00:00', 'pints': 1},
+        {'id': 'entry-2', 'date': '2024-06-01', 'time': '20:00:00', 'half_pints': 1},
+    ]
+    client.post('/api/consumption/batch', json=batch)
+
+    # Réponse perdue : le client renvoie le lot, avec une nouvelle entrée
+    response = client.post('/api/consumption/batch', json=batch + [
+        {'id': 'entry-3', 'date': '2024-06-01', 'time': '20:00:00', 'pints': 1},
+        {'id': 7, 'date': '2024-06-01', 'time': '20:00:00', 'pints': 1},
+    ])
+
+    body = response.get_json()
+    assert body['written'] == 1
+    assert [(result['ok'], result.get('duplicate', False)) for result in body['results']] == [
+        (True, True), (True, True), (True, False), (False, False)
+    ]
+    with app.app_context():
+        records = Database.get_consumption(Database.get_user_id('alice'))
+        assert [(r['pints'], r['half_pints']) for r in records] == [(2, 1)]
+        assert Database.check_rollups() == []
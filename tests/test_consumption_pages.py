@@ -0,0 +1,39 @@
+from auth import hash_password
+from models import Database
+
+
+def _login(app):
+    with app.app_context():
+        Database.create_user('alice', hash_password('secret'))
+        user_id = Database.get_user_id('alice')
+    client = app.test_client()
+    client.post('/login', data={'username': 'alice', 'password': 'secret'})
+    return client, user_id
+
+
+def test_pages_past_irregular_times(app):
+    client, user_id = _login(app)
+    # Heures telles qu'un import peut les laisser : pas toujours HH:MM:SS
+    for time_value in ('21:30:00', '20:00', '19:15:00', '9:00'):
+        Database.add_consumption(user_id, '2024-06-01', pints=1, time=time_value)
+
+    times, cursor = [], None
+    while True:
+        query = '/api/consumption?view=records&limit=1' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(query)
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        times.extend(record['time'] for record in body['records'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert times == ['9:00', '21:30:00', '20:00', '19:15:00']
+
+
+def test_invalid_cursor(app):
+    client, _ = _login(app)
+    for cursor in ('2024-06-01T20:00:00', 'bm90IGpzb24=', 'WzFd'):
+        response = client.get(f'/api/consumption?view=records&cursor={cursor}')
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'invalid cursor'}
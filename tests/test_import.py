@@ -0,0 +1,22 @@
+from models import Database
+from utils import import_csv
+
+
+def test_out_of_range_quantity_is_a_row_error(db_path):
+    content = (
+        "username,date,time,pints,half_pints,liters_33\n"
+        "alice,2024-06-01,20:00:00,1,0,0\n"
+        "alice,2024-06-01,21:00:00,99999999999999999999,0,0\n"
+        "alice,2024-06-01,22:00:00,0,2,0\n"
+    ).encode()
+
+    imported, errors, created = import_csv(content)
+
+    assert imported == 2
+    assert len(errors) == 1 and '99999999999999999999' in errors[0]
+    assert [user['username'] for user in created] == ['alice']
+    records = Database.get_consumption(Database.get_user_id('alice'))
+    assert sorted((r['time'], r['pints'], r['half_pints']) for r in records) == [
+        ('20:00:00', 1, 0), ('22:00:00', 0, 2)
+    ]
+    assert Database.check_rollups() == []
@@ -0,0 +1,108 @@
+import jobs
+from job_runner import JobRunner
+from models import Database
+
+
+def _expire_running_jobs():
+    conn = Database.get_connection()
+    conn.execute("UPDATE jobs SET updated_at = datetime('now', '-1 hour') WHERE status = 'running'")
+    conn.commit()
+    conn.close()
+
+
+def test_job_declared_lost_stays_failed(app, tmp_path):
+    result_path = tmp_path / 'export.csv'
+
+    def slow_handler(job, report):
+        # Pendant ce temps, un autre processus déclare la tâche perdue
+        _expire_running_jobs()
+        assert Database.claim_job(stale_seconds=60) is None
+        result_path.write_text('date\n')
+        return {'rows': 0}, str(result_path)
+
+    runner = JobRunner(app, {jobs.EXPORT: slow_handler}, workers=0)
+    job_id = Database.create_job(jobs.EXPORT)
+    assert runner.run_pending() == 1
+
+    job = Database.get_job(job_id)
+    assert (job['status'], job['error']) == (jobs.FAILED, 'interrupted')
+    assert not result_path.exists()
+    assert not Database.report_job_progress(job_id, 10)
+    assert not Database.fail_job(job_id, 'late error')
+    assert Database.get_job(job_id)['error'] == 'interrupted'
+
+
+def test_progress_of_a_lost_job_stops_the_handler(app):
+    steps = []
+
+    def handler(job, report):
+        report(0, 3)
+        _expire_running_jobs()
+        Database.claim_job(stale_seconds=60)
+        steps.append('before')
+        report(1, 3)
+        steps.append('after')
+        return {}, None
+
+    runner = JobRunner(app, {jobs.IMPORT: handler}, workers=0)
+    job_id = Database.create_job(jobs.IMPORT)
+    runner.run_pending()
+
+    assert steps == ['before']
+    assert Database.get_job(job_id)['status'] == jobs.FAILED
+
+
+def test_idle_poll_takes_no_write_lock(app, monkeypatch):
+    runner = JobRunner(app, {}, workers=0)
+    claims = []
+    claim_job = Database.claim_job
+    monkeypatch.setattr(Database, 'claim_job', staticmethod(lambda stale: claims.append(stale) or claim_job(stale)))
+
+    assert runner.run_pending() == 0
+    assert claims == []
+
+    job_id = Database.create_job('unknown')
+    assert runner.run_pending() == 1
+    assert len(claims) == 1
+    assert Database.get_job(job_id)['status'] == jobs.FAILED
+
+
+def test_failed_import_resumes_after_its_checkpoint(app, tmp_path, monkeypatch):
+    import utils
+
+    input_path = tmp_path / 'import.csv'
+    input_path.write_text(
+        "username,date,time,pints,half_pints,liters_33\n"
+        + ''.join(f"alice,2024-06-01,2{hour}:00:00,1,0,0\n" for hour in range(4))
+    )
+    monkeypatch.setattr(utils, 'IMPORT_BATCH_SIZE', 2)
+    add_consumption_batch = Database.add_consumption_batch
+    calls = []
+
+    def crash_on_second_batch(entries, job_checkpoint=None):
+        calls.append(job_checkpoint)
+        if len(calls) == 2:
+            raise RuntimeError('crash')
+        return add_consumption_batch(entries, job_checkpoint)
+
+    monkeypatch.setattr(Database, 'add_consumption_batch', staticmethod(crash_on_second_batch))
+    runner = app.extensions['job_runner']
+    job_id = Database.create_job(jobs.IMPORT, None, str(input_path))
+    runner.run_pending()
+
+    job = Database.get_job(job_id)
+    assert (job['status'], job['checkpoint']) == (jobs.FAILED, 2)
+
+    with app.test_request_context():
+        from app import job_summary
+        assert job_summary(job)['resumable']
+    assert Database.resume_job(job_id)
+    assert not Database.resume_job(job_id)
+    runner.run_pending()
+
+    job = Database.get_job(job_id)
+    assert (job['status'], job['checkpoint'], job['result']['resumed_from']) == (jobs.DONE, 4, 2)
+    assert job['result']['imported'] == 2
+    records = Database.get_consumption(Database.get_user_id('alice'))
+    assert sorted((r['time'], r['pints']) for r in records) == [(f'2{hour}:00:00', 1) for hour in range(4)]
+    assert Database.check_rollups() == []
@@ -0,0 +1,34 @@
+from auth import hash_password
+from models import Database
+
+
+def _login(app, username):
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': 'secret'})
+    return client
+
+
+def test_leaderboard_body_follows_etag_across_processes(app, app_config):
+    """Deux workers, chacun son cache mémoire : l'écriture de l'un n'invalide que le sien"""
+    from app import create_app
+
+    other_worker = create_app(app_config)
+    with app.app_context():
+        Database.create_user('alice', hash_password('secret'))
+        Database.create_user('bob', hash_password('secret'))
+
+    alice = _login(app, 'alice')
+    first = alice.get('/api/leaderboard')
+    assert first.get_json()['drinkers'][0]['total_pints'] is None
+
+    bob = _login(other_worker, 'bob')
+    today = first.get_json()
+    assert bob.post('/api/consumption', json={
+        'date': f"{today['year']:04d}-{today['month']:02d}-01", 'time': '20:00:00', 'pints': 3
+    }).get_json() == {'success': True}
+
+    second = alice.get('/api/leaderboard', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    drinkers = second.get_json()['drinkers']
+    assert drinkers[0]['username'] == 'bob' and drinkers[0]['total_pints'] == 3
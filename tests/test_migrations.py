@@ -0,0 +1,57 @@
+import sqlite3
+
+import migrations
+from migrations import Migration, apply_migrations, current_version
+
+
+def _connect(path):
+    # isolation_level=None : BEGIN / COMMIT explicites, comme le pool de models.py
+    return sqlite3.connect(path, isolation_level=None, timeout=5)
+
+
+def test_second_runner_during_backfill(tmp_path):
+    """Un second processus qui démarre pendant un remplissage ne doit pas échouer"""
+    path = str(tmp_path / 'db.sqlite3')
+    runs = []
+
+    def create(conn):
+        conn.execute('CREATE TABLE IF NOT EXISTS totals (user_id TEXT PRIMARY KEY, total INTEGER)')
+
+    def backfill(conn):
+        runs.append(conn)
+        if len(runs) == 1:
+            # Le premier remplissage n'est pas encore enregistré : un second
+            # processus démarre et passe la même migration
+            other = _connect(path)
+            try:
+                assert apply_migrations(other, steps) == 2
+            finally:
+                other.close()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute("INSERT OR REPLACE INTO totals VALUES ('a', 1)")
+        conn.commit()
+
+    steps = [
+        Migration(1, "totals", create, backfill),
+        Migration(2, "index", lambda conn: conn.execute('CREATE INDEX IF NOT EXISTS idx_totals ON totals (total)'), None),
+    ]
+
+    conn = _connect(path)
+    try:
+        assert apply_migrations(conn, steps) == 2
+        assert len(runs) == 2
+        assert conn.execute('SELECT COUNT(*) FROM schema_version').fetchone()[0] == 2
+        assert conn.execute('SELECT * FROM totals').fetchall() == [('a', 1)]
+    finally:
+        conn.close()
+
+
+def test_all_migrations_then_noop(tmp_path):
+    conn = _connect(str(tmp_path / 'db.sqlite3'))
+    try:
+        latest = max(migration.version for migration in migrations.MIGRATIONS)
+        assert apply_migrations(conn) == latest
+        assert apply_migrations(conn) == latest
+        assert current_version(conn) == latest
+    finally:
+        conn.close()
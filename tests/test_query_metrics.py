@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from models import Database
+
+ROWS = 20
+ROW_SECONDS = 0.005
+
+SLOW_SCAN = '''
+    WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < ?)
+    SELECT slow(x) FROM n
+'''
+
+
+@pytest.fixture
+def observed(db_path):
+    queries = []
+    conn = Database.get_connection()
+    Database.set_observers(query=lambda sql, seconds: queries.append((sql, seconds)))
+    # Chaque ligne coûte ROW_SECONDS, calculées pendant la lecture
+    conn.create_function('slow', 1, lambda x: time.sleep(ROW_SECONDS) or x)
+    yield conn, queries
+    conn.close()
+    Database.set_observers()
+
+
+@pytest.mark.parametrize('read', [
+    lambda cursor: cursor.fetchall(),
+    lambda cursor: list(cursor),
+    lambda cursor: [row for rows in iter(lambda: cursor.fetchmany(3), []) for row in rows],
+])
+def test_fetch_time_is_part_of_the_statement(observed, read):
+    conn, queries = observed
+    cursor = conn.execute(SLOW_SCAN, (ROWS,))
+    assert queries == []
+    assert len(read(cursor)) == ROWS
+
+    assert [sql for sql, _ in queries] == [SLOW_SCAN]
+    assert queries[0][1] >= ROWS * ROW_SECONDS
+
+
+def test_statement_reported_when_abandoned_or_without_rows(observed):
+    conn, queries = observed
+    assert tuple(conn.execute(SLOW_SCAN, (ROWS,)).fetchone()) == (1,)
+    conn.execute('CREATE TABLE scratch (x INTEGER)')
+    assert [sql for sql, _ in queries] == [SLOW_SCAN, 'CREATE TABLE scratch (x INTEGER)']
@@ -0,0 +1,116 @@
+import pytest
+
+from models import Database
+import utils
+
+# Requêtes chaudes -> index attendus dans le plan (EXPLAIN QUERY PLAN).
+# Aucune ne doit trier ses lignes (USE TEMP B-TREE FOR ORDER BY) ni parcourir
+# toute une table de consommations.
+HOT_PATHS = {
+    'api_page': (
+        lambda user_id: Database.get_consumption_page(user_id, limit=100),
+        ['COVERING INDEX idx_consumption_user_date (user_id=?)', 'archive_consumption USING PRIMARY KEY (user_key=?)'],
+    ),
+    'api_next_page': (
+        lambda user_id: Database.get_consumption_page(user_id, limit=100, before=('2024-01-01', '20:00:00')),
+        ['idx_consumption_user_date (user_id=? AND (date,time)<(?,?))', 'archive_consumption USING PRIMARY KEY (user_key=? AND day<?)'],
+    ),
+    'history': (
+        lambda user_id: Database.get_consumption(user_id, '2022-01-01', '2022-12-31'),
+        ['idx_consumption_user_date (user_id=? AND date>? AND date<?)', 'archive_consumption USING PRIMARY KEY (user_key=? AND day>? AND day<?)'],
+    ),
+    'export_one_user': (
+        lambda user_id: list(Database.iter_consumption_export(user_id)),
+        ['COVERING INDEX idx_consumption_user_date (user_id=?)', 'archive_consumption USING PRIMARY KEY (user_key=?)'],
+    ),
+    'daily_stats': (
+        lambda user_id: Database.get_daily_consumption(user_id, '2024-01-01', '2024-12-31'),
+        ['consumption_daily USING PRIMARY KEY (user_id=? AND date>? AND date<?)'],
+    ),
+    'weekly_stats': (
+        lambda user_id: utils.calculate_weekly_stats(user_id, 4),
+        ['consumption_daily USING PRIMARY KEY (user_id=? AND date>? AND date<?)'],
+    ),
+}
+
+# Classements : lus depuis l'agrégat mensuel par son index ; le tri (RANK() et
+# ORDER BY rank) porte sur une ligne par utilisateur, pas par consommation
+RANKINGS = {
+    'top_drinkers': lambda user_id: utils.get_top_drinkers(2024, 3),
+    'top_drinkers_month': lambda user_id: utils.get_top_drinkers_for_month(2024, 1, 3),
+    'drinker_rank': lambda user_id: utils.get_drinker_rank(user_id, 2024),
+}
+
+
+@pytest.fixture
+def user_id(db_path):
+    Database.create_user('alice', 'x')
+    user_id = Database.get_user_id('alice')
+    Database.add_consumption(user_id, '2022-03-01', pints=1, time='20:00:00')
+    Database.add_consumption(user_id, '2024-01-01', pints=1, time='20:00:00')
+    Database.archive_years(2023)
+    return user_id
+
+
+@pytest.fixture
+def query_plans(monkeypatch):
+    """Exécute une fonction et retourne le plan de chacune de ses requêtes de lecture"""
+    get_connection = Database.get_connection
+
+    def capture(call, *args):
+        statements = []
+
+        def traced_connection():
+            conn = get_connection()
+            # Requêtes avec leurs paramètres déjà substitués
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        monkeypatch.setattr(Database, 'get_connection', staticmethod(traced_connection))
+        try:
+            call(*args)
+        finally:
+            monkeypatch.setattr(Database, 'get_connection', get_connection)
+
+        conn = get_connection()
+        conn.set_trace_callback(None)
+        try:
+            return {
+                sql: [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+                for sql in statements
+                # SELECT 1 : vérification de la connexion par le pool
+                if sql.lstrip().upper().startswith(('SELECT', 'WITH')) and sql.strip() != 'SELECT 1'
+            }
+        finally:
+            conn.close()
+
+    return capture
+
+
+def _assert_no_scan(lines):
+    for table in ('consumption', 'archive_consumption', 'consumption_daily', 'consumption_monthly'):
+        assert not any(line.startswith(f'SCAN {table}') for line in lines), lines
+
+
+@pytest.mark.parametrize('name', HOT_PATHS)
+def test_hot_query_plans(name, user_id, query_plans):
+    call, expected = HOT_PATHS[name]
+    plans = query_plans(call, user_id)
+    assert plans
+
+    lines = [line for plan in plans.values() for line in plan]
+    for fragment in expected:
+        assert any(fragment in line for line in lines), (fragment, plans)
+    assert not any('USE TEMP B-TREE FOR ORDER BY' in line for line in lines), plans
+    _assert_no_scan(lines)
+
+
+@pytest.mark.parametrize('name', RANKINGS)
+def test_ranking_query_plans(name, user_id, query_plans):
+    plans = query_plans(RANKINGS[name], user_id)
+    assert len(plans) == 1
+
+    lines = next(iter(plans.values()))
+    assert any('consumption_monthly USING COVERING INDEX idx_consumption_monthly_month' in line for line in lines), lines
+    assert not any('consumption' in line and 'consumption_' not in line for line in lines), lines
+    _assert_no_scan(lines)
@@ -0,0 +1,28 @@
+from auth import hash_password
+from models import Database
+from utils import get_drinker_rank, get_top_drinkers
+
+
+def test_dashboard_rank_uses_the_sql_lookup(app):
+    from app import drinker_rank, get_leaderboard_cache
+
+    with app.app_context():
+        for index, pints in enumerate([4, 2, 2, 1]):
+            Database.create_user(f'user{index}', hash_password('secret'))
+            Database.add_consumption(Database.get_user_id(f'user{index}'), '2024-03-01', pints=pints)
+
+        ranking = [dict(row) for row in get_top_drinkers(2024)]
+        assert [(row['username'], row['rank']) for row in ranking] == [
+            ('user0', 1), ('user1', 2), ('user2', 2), ('user3', 4)
+        ]
+        sql_rank = dict(get_drinker_rank(Database.get_user_id('user2'), 2024))
+        assert sql_rank.pop('user_id') == Database.get_user_id('user2')
+        assert sql_rank == ranking[2]
+
+        cache = get_leaderboard_cache()
+        stats = cache.stats()
+        ranks = [drinker_rank(Database.get_user_id(f'user{index}'), 2024) for index in range(4)]
+        assert [{key: rank[key] for key in ranking[0]} for rank in ranks] == ranking
+        assert drinker_rank('nobody', 2024) is None
+        # Aucune entrée par utilisateur dans le cache des classements
+        assert cache.stats() == stats
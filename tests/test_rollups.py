@@ -0,0 +1,20 @@
+from models import Database
+
+
+def test_rebuild_fixes_drift_and_bumps_versions(db_path):
+    Database.create_user('alice', 'x')
+    user_id = Database.get_user_id('alice')
+    Database.add_consumption(user_id, '2024-03-01', pints=2)
+
+    conn = Database.get_connection()
+    conn.execute('UPDATE consumption_daily SET pints = 7')
+    conn.commit()
+    conn.close()
+    assert Database.check_rollups() != []
+
+    version = Database.get_leaderboard_version()
+    data_version = Database.get_user_data_state(user_id)['data_version']
+    assert Database.rebuild_rollups() == 1
+    assert Database.check_rollups() == []
+    assert Database.get_leaderboard_version() > version
+    assert Database.get_user_data_state(user_id)['data_version'] > data_version
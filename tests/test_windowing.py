@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+import random
+
+from windowing import find_heavy_windows
+
+
+def _reference_windows(today_records):
+    """Algorithme O(n²) d'origine de calculate_stats, gardé comme référence"""
+    warnings = []
+    processed_times = set()
+
+    for record in sorted(today_records, key=lambda r: r['time']):
+        record_time_str = record['time']
+        if record_time_str in processed_times:
+            continue
+
+        record_datetime = datetime.strptime(f"{record['date']} {record_time_str}", '%Y-%m-%d %H:%M:%S')
+        window_end = record_datetime + timedelta(hours=3)
+
+        window_liters = 0
+        window_items = []
+        window_times = []
+        for other_record in today_records:
+            other_datetime = datetime.strptime(f"{other_record['date']} {other_record['time']}", '%Y-%m-%d %H:%M:%S')
+            if record_datetime <= other_datetime <= window_end:
+                other_liters = (
+                    (other_record['pints'] or 0) * 0.5
+                    + (other_record['half_pints'] or 0) * 0.25
+                    + (other_record['liters_33'] or 0) * 0.33
+                )
+                window_liters += other_liters
+                window_items.append({'time': other_record['time'], 'liters': round(other_liters, 2)})
+                window_times.append(other_record['time'])
+
+        if window_liters >= 1.5:
+            warnings.append({
+                'start_time': record_time_str,
+                'end_time': window_end.strftime('%H:%M:%S'),
+                'total_liters': round(window_liters, 2),
+                'start_date': record['date'],
+                'end_date': window_end.strftime('%Y-%m-%d'),
+                'items': window_items
+            })
+            processed_times.update(window_times)
+
+    return warnings
+
+
+def _random_day(rng):
+    # Heures distinctes (une ligne par (utilisateur, date, heure)), serrées ou étalées
+    spread = rng.choice([3600, 6 * 3600, 86400])
+    count = rng.randint(0, 25)
+    seconds = rng.sample(range(min(spread, 86400)), count)
+    records = [
+        {
+            'date': '2024-06-01',
+            'time': f'{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}',
+            'pints': rng.choice([0, 0, 1, 2, None]),
+            'half_pints': rng.choice([0, 0, 1, 3, None]),
+            'liters_33': rng.choice([0, 0, 1, 2, None]),
+        }
+        for s in seconds
+    ]
+    rng.shuffle(records)
+    return records
+
+
+def test_matches_reference_on_random_days():
+    rng = random.Random(20240601)
+    flagged = 0
+    for _ in range(2000):
+        records = _random_day(rng)
+        expected = _reference_windows(records)
+        assert find_heavy_windows(records) == expected, records
+        flagged += bool(expected)
+    # Le tirage couvre bien les deux cas
+    assert 200 < flagged < 1800
+
+
+def test_threshold_is_inclusive():
+    records = [
+        {'date': '2024-06-01', 'time': '20:00:00', 'pints': 1, 'half_pints': 0, 'liters_33': 0},
+        {'date': '2024-06-01', 'time': '23:00:00', 'pints': 0, 'half_pints': 4, 'liters_33': 0},
+        {'date': '2024-06-01', 'time': '23:00:01', 'pints': 5, 'half_pints': 0, 'liters_33': 0},
+    ]
+    windows = find_heavy_windows(records)
+    assert windows == _reference_windows(records)
+    assert [(w['start_time'], w['total_liters']) for w in windows] == [('20:00:00', 1.5), ('23:00:01', 2.5)]
@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import sqlite3
+
+from models import Database
+
+PROCESSES = 4
+WRITES_PER_PROCESS = 50
+
+
+def _write_from_process(db_path, user_id, worker):
+    """Écritures d'un processus distinct (connexions et verrou propres) ; retourne les erreurs"""
+    Database.configure(db_path=db_path)
+    errors = []
+    for index in range(WRITES_PER_PROCESS):
+        try:
+            Database.add_consumption(user_id, '2024-06-01', pints=1, time=f'{worker:02d}:{index // 60:02d}:{index % 60:02d}')
+        except sqlite3.Error as e:
+            errors.append(str(e))
+    Database.close_pool()
+    return errors
+
+
+def test_concurrent_processes_never_hit_locked_database(db_path):
+    Database.create_user('writer', 'x')
+    user_id = Database.get_user_id('writer')
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=PROCESSES, mp_context=context) as executor:
+        futures = [executor.submit(_write_from_process, db_path, user_id, worker) for worker in range(PROCESSES)]
+        errors = [error for future in futures for error in future.result()]
+
+    assert errors == []
+    records = Database.get_consumption(user_id)
+    assert len(records) == PROCESSES * WRITES_PER_PROCESS
+    assert sum(record['pints'] for record in records) == PROCESSES * WRITES_PER_PROCESS
+
+
+def test_concurrent_requests_smoke(app):
+    """Plusieurs clients HTTP simultanés : aucune erreur, aucune écriture perdue"""
+    from auth import hash_password
+
+    clients_count, posts_per_client = 8, 10
+    with app.app_context():
+        password_hash = hash_password('secret')
+        for index in range(clients_count):
+            Database.create_user(f'user{index}', password_hash)
+
+    def client_session(index):
+        client = app.test_client()
+        statuses = [client.post('/login', data={'username': f'user{index}', 'password': 'secret'}).status_code]
+        for minute in range(posts_per_client):
+            response = client.post('/api/consumption', json={'date': '2024-06-01', 'time': f'20:{minute:02d}:00', 'pints': 1})
+            statuses.append(response.status_code)
+            statuses.append(client.get('/api/consumption').status_code)
+        statuses.append(client.get('/dashboard').status_code)
+        return statuses
+
+    with ThreadPoolExecutor(max_workers=clients_count) as executor:
+        statuses = [status for result in executor.map(client_session, range(clients_count)) for status in result]
+
+    assert all(status < 400 for status in statuses)
+    user_ids = Database.get_user_ids()
+    for index in range(clients_count):
+        records = Database.get_consumption(user_ids[f'user{index}'])
+        assert sum(record['pints'] for record in records) == posts_per_client
+
+
+def _increment_same_slot(db_path, user_id, rounds):
+    """Incréments concurrents d'un même (user_id, date, heure), unitaires et par lots"""
+    Database.configure(db_path=db_path)
+
+    def increment(_):
+        for _ in range(rounds):
+            Database.add_consumption(user_id, '2024-06-01', pints=1, time='20:00:00')
+            Database.add_consumption_batch([
+                (user_id, '2024-06-01', '20:00:00', 0, 1, 0),
+                (user_id, '2024-06-01', '20:00:00', 0, 0, 1),
+            ])
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(increment, range(4)))
+    Database.close_pool()
+
+
+def test_concurrent_increments_are_exact(db_path):
+    Database.create_user('writer', 'x')
+    user_id = Database.get_user_id('writer')
+    rounds = 10
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=PROCESSES, mp_context=context) as executor:
+        for future in [executor.submit(_increment_same_slot, db_path, user_id, rounds) for _ in range(PROCESSES)]:
+            future.result()
+
+    # PROCESSES processus x 4 threads x rounds tours, chacun +1 par colonne
+    expected = PROCESSES * 4 * rounds
+    records = Database.get_consumption(user_id)
+    assert [(r['pints'], r['half_pints'], r['liters_33']) for r in records] == [(expected, expected, expected)]
+    assert [tuple(day)[1:] for day in Database.get_daily_consumption(user_id)] == [(expected, expected, expected)]
+    assert Database.check_rollups() == []
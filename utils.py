@@ -1,106 +1,62 @@
-from models import Database
+from models import Database, MAX_QUANTITY
 from auth import hash_password
+from windowing import find_heavy_windows
 from datetime import datetime, timedelta, date, time as dt_time
+import codecs
 import csv
 import io
+import sqlite3
 
-def calculate_stats(user_id, start_date=None, end_date=None):
-    """Calculer les statistiques de consommation avec détection de fenêtres de 3h"""
-    records = Database.get_consumption(user_id, start_date, end_date)
-    
+# Nombre de lignes écrites par transaction lors d'un import CSV
+IMPORT_BATCH_SIZE = 5000
+# Taille approximative (en caractères) des morceaux envoyés lors d'un export CSV
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+def calculate_stats(user_id, start_date=None, end_date=None, include_records=True, records_limit=None, records_offset=0,
+                    weekly_stats=None):
+    """
+    Calculer les statistiques de consommation avec détection de fenêtres de 3h.
+    Les totaux sont agrégés en SQL ; la liste brute des enregistrements est
+    facultative (include_records) et paginable (records_limit/records_offset).
+    weekly_stats (résultat de calculate_weekly_stats) évite de relire les
+    jours de consommation de la semaine en cours.
+    """
     total_pints = 0
     total_half_pints = 0
     total_33cl = 0
-    total_liters = 0
     three_hour_warnings = []
     today_str = date.today().isoformat()
     monthly_stats = {}
     
-    for record in records:
-        pints = record['pints'] or 0
-        half_pints = record['half_pints'] or 0
-        liters_33 = record['liters_33'] or 0
-        
-        total_pints += pints
-        total_half_pints += half_pints
-        total_33cl += liters_33
+    for month in Database.get_monthly_consumption(user_id, start_date, end_date):
+        total_pints += month['pints']
+        total_half_pints += month['half_pints']
+        total_33cl += month['liters_33']
         
-        daily_liters = (pints * 0.5) + (half_pints * 0.25) + (liters_33 * 0.33)
-        total_liters += daily_liters
-        
-        month_key = record['date'][:7]
-        if month_key not in monthly_stats:
-            monthly_stats[month_key] = {'pints': 0, 'half_pints': 0, '33cl': 0}
-        monthly_stats[month_key]['pints'] += pints
-        monthly_stats[month_key]['half_pints'] += half_pints
-        monthly_stats[month_key]['33cl'] += liters_33
+        monthly_stats[month['month']] = {
+            'pints': month['pints'],
+            'half_pints': month['half_pints'],
+            '33cl': month['liters_33']
+        }
     
-    if records:
-        today_records = [r for r in records if r['date'] == today_str]
-        
-        if today_records:
-            processed_times = set()
-            
-            for record in sorted(today_records, key=lambda r: r['time']):
-                record_time_str = record['time']
-                
-                # Sauter si on a déjà traité cette heure
-                if record_time_str in processed_times:
-                    continue
-                
-                record_time = datetime.strptime(record_time_str, '%H:%M:%S').time()
-                record_datetime = datetime.combine(
-                    datetime.strptime(record['date'], '%Y-%m-%d').date(), 
-                    record_time
-                )
-                
-                # Fenêtre: de record_time à record_time + 3 heures
-                window_end = record_datetime + timedelta(hours=3)
-                
-                # Chercher tous les enregistrements dans cette fenêtre
-                window_liters = 0
-                window_items = []
-                window_times = []
-                
-                for other_record in today_records:
-                    other_time_str = other_record['time']
-                    other_time = datetime.strptime(other_time_str, '%H:%M:%S').time()
-                    other_datetime = datetime.combine(
-                        datetime.strptime(other_record['date'], '%Y-%m-%d').date(), 
-                        other_time
-                    )
-                    
-                    # Si l'enregistrement est dans la fenêtre de 3h
-                    if record_datetime <= other_datetime <= window_end:
-                        other_pints = other_record['pints'] or 0
-                        other_half = other_record['half_pints'] or 0
-                        other_33 = other_record['liters_33'] or 0
-                        
-                        other_liters = (other_pints * 0.5) + (other_half * 0.25) + (other_33 * 0.33)
-                        window_liters += other_liters
-                        window_items.append({
-                            'time': other_time_str,
-                            'liters': round(other_liters, 2)
-                        })
-                        window_times.append(other_time_str)
-                
-                # Créer l'avertissement seulement si dépassement ET première fois
-                if window_liters >= 1.5:
-                    three_hour_warnings.append({
-                        'start_time': record_time_str,
-                        'end_time': window_end.strftime('%H:%M:%S'),
-                        'total_liters': round(window_liters, 2),
-                        'start_date': record['date'],
-                        'end_date': window_end.strftime('%Y-%m-%d'),
-                        'items': window_items
-                    })
-                    
-                    # Marquer tous les enregistrements de cette fenêtre comme traités
-                    for time_str in window_times:
-                        processed_times.add(time_str)
+    total_liters = (total_pints * 0.5) + (total_half_pints * 0.25) + (total_33cl * 0.33)
+    
+    records = []
+    if include_records:
+        records = Database.get_consumption(user_id, start_date, end_date, records_limit, records_offset)
+    
+    # Fenêtres glissantes de 3h sur les consommations du jour (si aujourd'hui est dans la période)
+    if (not start_date or start_date <= today_str) and (not end_date or today_str <= end_date):
+        today_records = Database.get_consumption(user_id, today_str, today_str)
+        three_hour_warnings.extend(find_heavy_windows(today_records))
     
     # Vérifier si c'est le 3ème jour de la semaine
-    is_third_day_or_more, drinking_days = check_weekly_drinking_days(user_id, today_str)
+    current_week_start = (date.today() - timedelta(days=date.today().weekday())).isoformat()
+    if weekly_stats and weekly_stats[-1]['week_start'] == current_week_start:
+        drinking_days = weekly_stats[-1]['drinking_days']
+        is_third_day_or_more = len(drinking_days) >= 3
+    else:
+        is_third_day_or_more, drinking_days = check_weekly_drinking_days(user_id, today_str)
     
     if is_third_day_or_more:
         day_indexes = []
@@ -133,43 +89,94 @@ def calculate_stats(user_id, start_date=None, end_date=None):
         'all_records': records
     }
 
-def export_csv(user_id=None, all_users=False):
-    """Exporter les données en CSV"""
+def export_csv(user_id=None, all_users=False, progress=None):
+    """
+    Exporter les données en CSV, morceau par morceau (générateur de chaînes).
+    progress(lignes écrites), facultatif, est appelé à chaque morceau.
+    """
     output = io.StringIO()
     writer = csv.writer(output)
     
     if all_users:
         writer.writerow(['Utilisateur', 'Date', 'Heure', 'Pintes', 'Demis', '33cl'])
-        users = Database.get_all_users()
-        for user in users:
-            records = Database.get_consumption(user['id'])
-            for record in records:
-                writer.writerow([
-                    user['username'],
-                    record['date'],
-                    record['time'] if 'time' in record.keys() else '00:00:00',
-                    record['pints'] or 0,
-                    record['half_pints'] or 0,
-                    record['liters_33'] or 0
-                ])
+        rows = (
+            [
+                record['username'],
+                record['date'],
+                record['time'],
+                record['pints'] or 0,
+                record['half_pints'] or 0,
+                record['liters_33'] or 0
+            ]
+            for record in Database.iter_consumption_export()
+        )
     else:
         writer.writerow(['Date', 'Heure', 'Pintes', 'Demis', '33cl'])
-        records = Database.get_consumption(user_id)
-        for record in records:
-            writer.writerow([
+        rows = (
+            [
                 record['date'],
-                record['time'] if 'time' in record.keys() else '00:00:00',
+                record['time'],
                 record['pints'] or 0,
                 record['half_pints'] or 0,
                 record['liters_33'] or 0
-            ])
+            ]
+            for record in Database.iter_consumption_export(user_id)
+        )
+    
+    written = 0
+    for row in rows:
+        writer.writerow(row)
+        written += 1
+        # Vider le tampon régulièrement : la mémoire reste constante
+        if output.tell() >= EXPORT_CHUNK_SIZE:
+            if progress:
+                progress(written)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
     
-    return output.getvalue()
+    if progress:
+        progress(written)
+    yield output.getvalue()
+
+def _write_import_batch(batch, errors, job_id=None):
+    """
+    Écrire un lot d'import ; en cas d'échec, ligne par ligne pour isoler les
+    erreurs. Avec job_id, chaque écriture enregistre le numéro de sa dernière
+    ligne comme point de reprise de la tâche, dans la même transaction.
+    """
+    def checkpoint(line):
+        return None if job_id is None else (job_id, line)
+
+    try:
+        return Database.add_consumption_batch((entry for entry, _, _ in batch), checkpoint(batch[-1][2]))
+    except sqlite3.Error:
+        written = 0
+        for entry, row, line in batch:
+            try:
+                Database.add_consumption_batch([entry], checkpoint(line))
+                written += 1
+            except sqlite3.Error as e:
+                errors.append(f"Ligne invalide {row}: {str(e)}")
+        return written
 
-def import_csv(file_content, user_id=None, all_users=False):
-    """Importer des données depuis un CSV"""
-    decoded = file_content.decode('utf-8')
-    reader = csv.reader(io.StringIO(decoded))
+def _parse_quantity(value):
+    """Quantité d'une ligne d'import ; ValueError si illisible ou hors bornes"""
+    quantity = int(value)
+    if abs(quantity) > MAX_QUANTITY:
+        raise ValueError(f"quantité hors limites : {quantity}")
+    return quantity
+
+def import_csv(file_content, user_id=None, all_users=False, progress=None, job_id=None, start_row=0):
+    """
+    Importer des données depuis un CSV (bytes ou fichier binaire, lu au fil de l'eau).
+    progress(lignes lues), facultatif, est appelé après chaque lot écrit.
+    job_id : tâche de fond dont le point de reprise suit les lots validés ;
+    start_row : lignes déjà importées (point de reprise), sautées.
+    """
+    if isinstance(file_content, bytes):
+        file_content = io.BytesIO(file_content)
+    reader = csv.reader(codecs.iterdecode(file_content, 'utf-8'))
     
     header = next(reader, None)
 
@@ -177,132 +184,143 @@ def import_csv(file_content, user_id=None, all_users=False):
     errors = []
     created_users = []
 
+    # Une seule requête pour tous les utilisateurs, un seul hash pour le mot de passe temporaire
+    user_ids = Database.get_user_ids()
+    temp_password = "changeme123"
+    temp_password_hash = None
+    batch = []
+
+    rows_read = 0
     for row in reader:
+        rows_read += 1
+        if rows_read <= start_row:
+            continue
         try:
             username = row[0].strip()
             date = row[1].strip()
             time_value = row[2].strip() if len(row) > 2 else "00:00:00"
-            pints = int(row[3]) if len(row) > 3 else 0
-            half_pints = int(row[4]) if len(row) > 4 else 0
-            liters_33 = int(row[5]) if len(row) > 5 else 0
+            pints = _parse_quantity(row[3]) if len(row) > 3 else 0
+            half_pints = _parse_quantity(row[4]) if len(row) > 4 else 0
+            liters_33 = _parse_quantity(row[5]) if len(row) > 5 else 0
 
             # Vérifier si utilisateur existe
-            if not Database.user_exists(username):
+            if username not in user_ids:
                 # Création automatique
-                temp_password = "changeme123"
-                password_hash = hash_password(temp_password)
-                success, message = Database.create_user(username, password_hash)
+                if temp_password_hash is None:
+                    temp_password_hash = hash_password(temp_password)
+                success, message = Database.create_user(username, temp_password_hash)
 
                 if success:
                     created_users.append({
                         "username": username,
                         "password": temp_password
                     })
+                    user_ids[username] = Database.get_user_id(username)
                 else:
                     errors.append(f"Erreur création utilisateur {username}")
                     continue
 
-            user_uuid = Database.get_user_id(username)
-
-            Database.add_consumption(
-                user_uuid,
-                date,
-                pints,
-                half_pints,
-                liters_33,
-                time_value
-            )
-
-            imported_count += 1
+            batch.append(((user_ids[username], date, time_value, pints, half_pints, liters_33), row, rows_read))
 
         except Exception as e:
             errors.append(f"Ligne invalide {row}: {str(e)}")
+            continue
 
-    return imported_count, errors, created_users
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported_count += _write_import_batch(batch, errors, job_id)
+            batch = []
+            if progress:
+                progress(rows_read)
 
-def get_top_drinkers(year=None):
-    """Obtenir le classement des plus gros buveurs"""
-    if year is None:
-        year = date.today().year
+    if batch:
+        imported_count += _write_import_batch(batch, errors, job_id)
+    if progress:
+        progress(rows_read)
 
-    start = f"{year}-01-01"
-    end = f"{year}-12-31"
+    return imported_count, errors, created_users
 
-    conn = Database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+# Classement complet calculé en SQL : totaux par utilisateur depuis l'agrégat
+# mensuel, puis RANK() (les ex aequo partagent le même rang)
+_RANKING_CTE = """
+    WITH ranking AS (
         SELECT
+            users.id AS user_id,
             users.username,
-            SUM(consumption.pints) AS total_pints,
-            SUM(consumption.half_pints) AS total_half_pints,
-            SUM(consumption.liters_33) AS total_33cl,
-            ROUND(
-                SUM(consumption.pints) * 0.5 +
-                SUM(consumption.half_pints) * 0.25 +
-                SUM(consumption.liters_33) * 0.33, 2
-            ) AS total_liters
+            totals.total_pints,
+            totals.total_half_pints,
+            totals.total_33cl,
+            totals.total_liters,
+            RANK() OVER (ORDER BY totals.total_liters DESC) AS rank
         FROM users
-        LEFT JOIN consumption
-            ON users.id = consumption.user_id
-            AND consumption.date >= ?
-            AND consumption.date <= ?
+        LEFT JOIN (
+            SELECT
+                user_id,
+                SUM(pints) AS total_pints,
+                SUM(half_pints) AS total_half_pints,
+                SUM(liters_33) AS total_33cl,
+                ROUND(
+                    SUM(pints) * 0.5 +
+                    SUM(half_pints) * 0.25 +
+                    SUM(liters_33) * 0.33, 2
+                ) AS total_liters
+            FROM consumption_monthly
+            WHERE month >= ? AND month <= ?
+            GROUP BY user_id
+        ) AS totals ON totals.user_id = users.id
         WHERE users.is_admin = 0
-        GROUP BY users.id, users.username
-        ORDER BY total_liters DESC
-    """, (start, end))
+    )
+"""
+_RANKING_COLUMNS = "username, total_pints, total_half_pints, total_33cl, total_liters, rank"
+
+def _month_range(year=None, month=None):
+    """Mois de début et de fin (YYYY-MM) d'une année, ou d'un mois précis"""
+    if year is None:
+        year = date.today().year
+    if month is None:
+        return f"{year}-01", f"{year}-12"
+    return f"{year}-{month:02d}", f"{year}-{month:02d}"
+
+def _get_ranking(start_month, end_month, limit=None, offset=0):
+    """Classement des utilisateurs non-admin sur les mois [start_month, end_month] (YYYY-MM)"""
+    conn = Database.get_connection()
+    cursor = conn.cursor()
+    # LIMIT -1 : pas de limite pour SQLite
+    cursor.execute(
+        f"{_RANKING_CTE} SELECT {_RANKING_COLUMNS} FROM ranking ORDER BY rank, username LIMIT ? OFFSET ?",
+        (start_month, end_month, -1 if limit is None else limit, offset)
+    )
     drinkers = cursor.fetchall()
     conn.close()
     return drinkers
 
-def get_top_drinkers_for_month(year=None, month=None):
+def get_top_drinkers(year=None, limit=None, offset=0):
+    """Obtenir le classement des plus gros buveurs (limit/offset pour paginer)"""
+    return _get_ranking(*_month_range(year), limit, offset)
+
+def get_top_drinkers_for_month(year=None, month=None, limit=None, offset=0):
     """Obtenir le classement des plus gros buveurs pour un mois donné"""
-    today = date.today()
-    if year is None:
-        year = today.year
     if month is None:
-        month = today.month
-
-    start = f"{year}-{month:02d}-01"
-    if month == 12:
-        next_month = date(year + 1, 1, 1)
-    else:
-        next_month = date(year, month + 1, 1)
-    end = (next_month - timedelta(days=1)).isoformat()
+        month = date.today().month
+    return _get_ranking(*_month_range(year, month), limit, offset)
 
+def get_drinker_rank(user_id, year=None, month=None):
+    """Obtenir la ligne de classement d'un utilisateur (rang compris), ou None"""
+    start_month, end_month = _month_range(year, month)
     conn = Database.get_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT
-            users.username,
-            SUM(consumption.pints) AS total_pints,
-            SUM(consumption.half_pints) AS total_half_pints,
-            SUM(consumption.liters_33) AS total_33cl,
-            ROUND(
-                SUM(consumption.pints) * 0.5 +
-                SUM(consumption.half_pints) * 0.25 +
-                SUM(consumption.liters_33) * 0.33, 2
-            ) AS total_liters
-        FROM users
-        LEFT JOIN consumption
-            ON users.id = consumption.user_id
-            AND consumption.date >= ?
-            AND consumption.date <= ?
-        WHERE users.is_admin = 0
-        GROUP BY users.id, users.username
-        ORDER BY total_liters DESC
-    """, (start, end))
-    drinkers = cursor.fetchall()
+    cursor.execute(
+        f"{_RANKING_CTE} SELECT user_id, {_RANKING_COLUMNS} FROM ranking WHERE user_id = ?",
+        (start_month, end_month, user_id)
+    )
+    drinker = cursor.fetchone()
     conn.close()
-    return drinkers
+    return drinker
 
 def check_weekly_drinking_days(user_id, current_date):
     """
     Vérifie si c'est le 3ème jour de consommation de la semaine (lundi-dimanche).
     Retourne (is_third_day, drinking_days)
     """
-    from datetime import datetime, timedelta
-    from models import Database
-    
     if isinstance(current_date, str):
         current_date_obj = datetime.strptime(current_date, '%Y-%m-%d').date()
     else:
@@ -314,66 +332,46 @@ def check_weekly_drinking_days(user_id, current_date):
     week_end = week_start + timedelta(days=6)
     
     # Récupérer tous les jours de consommation de la semaine
-    conn = Database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT date 
-        FROM consumption 
-        WHERE user_id = ? 
-        AND date >= ? 
-        AND date <= ?
-        ORDER BY date
-    """, (user_id, week_start.isoformat(), week_end.isoformat()))
-    
-    drinking_days = [row[0] for row in cursor.fetchall()]
-    conn.close()
+    weeks = Database.get_weekly_consumption(user_id, week_start.isoformat(), week_end.isoformat())
+    drinking_days = sorted(weeks[0]['drinking_days'].split(',')) if weeks else []
     
     return len(drinking_days) >= 3, drinking_days
 
-def calculate_weekly_stats(user_id):
-    """Calculer les stats des 4 dernières semaines en litres (incluant la semaine en cours)"""
-    from datetime import datetime, timedelta
-    from models import Database
-    
+def calculate_weekly_stats(user_id, weeks=4):
+    """Calculer les stats des N dernières semaines en litres (incluant la semaine en cours), en une requête"""
     today = datetime.now().date()
     
     # Trouver le lundi de la semaine courante
     days_since_monday = today.weekday()
     current_week_start = today - timedelta(days=days_since_monday)
+    first_week_start = current_week_start - timedelta(weeks=weeks - 1)
     
-    # Calculer les 4 semaines (incluant la courante)
-    weeks = []
-    for i in range(3, -1, -1):  # 3, 2, 1, 0
-        week_start = current_week_start - timedelta(weeks=i)
-        week_end = week_start + timedelta(days=6)
-        weeks.append({
-            'start': week_start,
-            'end': week_end
-        })
+    rows = Database.get_weekly_consumption(
+        user_id,
+        first_week_start.isoformat(),
+        (current_week_start + timedelta(days=6)).isoformat()
+    )
+    rows_by_week = {row['week_start']: row for row in rows}
     
-    # Récupérer les données pour chaque semaine
+    # Une entrée par semaine, y compris les semaines sans consommation
     weekly_data = []
-    for week in weeks:
-        records = Database.get_consumption(
-            user_id, 
-            week['start'].isoformat(), 
-            week['end'].isoformat()
-        )
+    for i in range(weeks):
+        week_start = first_week_start + timedelta(weeks=i)
+        week_end = week_start + timedelta(days=6)
+        row = rows_by_week.get(week_start.isoformat())
         
         total_liters = 0
-        
-        for record in records:
-            pints = record['pints'] or 0
-            half_pints = record['half_pints'] or 0
-            liters_33 = record['liters_33'] or 0
-            
+        drinking_days = []
+        if row:
             # Convertir en litres : pinte=0.5L, demi=0.25L, 33cl=0.33L
-            total_liters += (pints * 0.5) + (half_pints * 0.25) + (liters_33 * 0.33)
+            total_liters = (row['pints'] * 0.5) + (row['half_pints'] * 0.25) + (row['liters_33'] * 0.33)
+            drinking_days = sorted(row['drinking_days'].split(','))
         
         weekly_data.append({
-            'week_start': week['start'].isoformat(),
-            'week_end': week['end'].isoformat(),
-            'total_liters': round(total_liters, 2)
+            'week_start': week_start.isoformat(),
+            'week_end': week_end.isoformat(),
+            'total_liters': round(total_liters, 2),
+            'drinking_days': drinking_days
         })
     
     return weekly_data
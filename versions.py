@@ -0,0 +1,36 @@
+# Numéros de version des données, incrémentés dans la transaction de chaque
+# écriture : les réponses GET en tirent un ETag sans recalculer les statistiques.
+# - users.data_version : données d'un utilisateur (consommations, mode soirée)
+# - data_versions['leaderboard'] : tout ce qui peut changer un classement
+
+LEADERBOARD = 'leaderboard'
+
+
+def create_tables(conn):
+    """Ajouter les compteurs de version"""
+    conn.execute('ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('INSERT OR IGNORE INTO data_versions (scope, version) VALUES (?, 0)', (LEADERBOARD,))
+
+
+def bump_users(conn, user_ids):
+    """Nouvelle version des données de ces utilisateurs, dans la transaction de l'appelant"""
+    conn.executemany(
+        'UPDATE users SET data_version = data_version + 1 WHERE id = ?',
+        [(user_id,) for user_id in set(user_ids)]
+    )
+
+
+def bump_leaderboard(conn):
+    """Nouvelle version des classements, dans la transaction de l'appelant"""
+    conn.execute('UPDATE data_versions SET version = version + 1 WHERE scope = ?', (LEADERBOARD,))
+
+
+def leaderboard_version(conn):
+    row = conn.execute('SELECT version FROM data_versions WHERE scope = ?', (LEADERBOARD,)).fetchone()
+    return row[0] if row else 0
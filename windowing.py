@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+# Fenêtre glissante et seuil de l'alerte "consommation excessive"
+WINDOW = timedelta(hours=3)
+THRESHOLD_LITERS = 1.5
+
+
+def _liters(record):
+    return ((record['pints'] or 0) * 0.5) + ((record['half_pints'] or 0) * 0.25) + ((record['liters_33'] or 0) * 0.33)
+
+
+def _centiliters(record):
+    # Sommes en entiers : pas d'erreur d'arrondi flottant autour du seuil
+    return (record['pints'] or 0) * 50 + (record['half_pints'] or 0) * 25 + (record['liters_33'] or 0) * 33
+
+
+def find_heavy_windows(records, window=WINDOW, threshold_liters=THRESHOLD_LITERS):
+    """
+    Détecter les fenêtres [heure, heure + 3h] où le seuil est atteint.
+    Parcours en deux pointeurs sur les horodatages triés (analysés une seule
+    fois) : O(n log n) au lieu de O(n²). Une fenêtre signalée absorbe ses
+    enregistrements, la suivante démarre après elle. Les items d'une fenêtre
+    sont listés dans l'ordre de records.
+    """
+    entries = sorted(
+        (datetime.strptime(f"{record['date']} {record['time']}", '%Y-%m-%d %H:%M:%S'), position, record)
+        for position, record in enumerate(records)
+    )
+    threshold_cl = round(threshold_liters * 100)
+
+    # prefix_cl[k] = total des k premiers enregistrements (en centilitres)
+    prefix_cl = [0]
+    for _, _, record in entries:
+        prefix_cl.append(prefix_cl[-1] + _centiliters(record))
+
+    warnings = []
+    start = 0
+    end = 0
+    while start < len(entries):
+        start_datetime, _, start_record = entries[start]
+        window_end = start_datetime + window
+
+        while end < len(entries) and entries[end][0] <= window_end:
+            end += 1
+
+        window_cl = prefix_cl[end] - prefix_cl[start]
+        if window_cl < threshold_cl:
+            start += 1
+            continue
+
+        in_window = sorted(entries[start:end], key=lambda entry: entry[1])
+        warnings.append({
+            'start_time': start_record['time'],
+            'end_time': window_end.strftime('%H:%M:%S'),
+            'total_liters': round(window_cl / 100, 2),
+            'start_date': start_record['date'],
+            'end_date': window_end.strftime('%Y-%m-%d'),
+            'items': [
+                {'time': record['time'], 'liters': round(_liters(record), 2)}
+                for _, _, record in in_window
+            ]
+        })
+        start = end
+
+    return warnings